@@ -1,19 +1,29 @@
 from __future__ import annotations
 
 import os
+import atexit
 import json
 import re
 import hmac
 import hashlib
 import secrets
+import struct
+import base64
+import binascii
+import queue
+import ssl
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, date, timedelta, timezone
 from zoneinfo import ZoneInfo
 from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Query
+import anyio
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File, Query, BackgroundTasks
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, EmailStr, Field
@@ -21,6 +31,16 @@ from pydantic import BaseModel, EmailStr, Field
 import smtplib
 from email.message import EmailMessage
 
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    from fastpbkdf2 import pbkdf2_hmac
+except ImportError:  # optional: same derivation through OpenSSL's generic PKCS5_PBKDF2_HMAC
+    from hashlib import pbkdf2_hmac
+
 
 # ======================================================
 # PATHS / APP
@@ -45,7 +65,15 @@ COOKIE_SECURE = os.getenv("RENDER") == "true"  # ou usa uma env tua
 DUBLIN_TZ = ZoneInfo("Europe/Dublin")
 
 
-app = FastAPI(title="Work Hours Tracker", version="9.3")
+class FastJSONResponse(JSONResponse):
+    # C-level encoding via orjson when it is installed
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+app = FastAPI(title="Work Hours Tracker", version="9.3", default_response_class=FastJSONResponse)
 
 # Static
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
@@ -70,7 +98,12 @@ async def no_cache_api(request: Request, call_next):
 # TIME HELPER (FIXES YOUR 500 BUG: now() was missing)
 # ======================================================
 def now() -> str:
-    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+    # same text as datetime.now(timezone.utc).isoformat(timespec="seconds"), without the datetime
+    t = time.gmtime()
+    return (
+        f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+        f"T{t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}+00:00"
+    )
 
 
 def local_now() -> datetime:
@@ -84,18 +117,153 @@ def utc_from_iso(value: str) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+def break_elapsed_min(break_start: Any) -> int:
+    # clock_state.break_start holds epoch seconds; rows written before that hold an ISO timestamp
+    try:
+        started = int(break_start)
+    except (TypeError, ValueError):
+        started = int(utc_from_iso(str(break_start)).timestamp())
+    return max(0, (int(time.time()) - started) // 60)
+
+
 # ======================================================
 # DB / MIGRATIONS
 # ======================================================
+# journal_mode=WAL is persisted in the db file, so it only needs to run once per process.
+# The rest are per-connection settings, applied once when each long-lived connection is opened.
+SQLITE_PRAGMAS = (
+    "PRAGMA foreign_keys=ON;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA mmap_size=268435456;",
+    "PRAGMA cache_size=-65536;",
+    "PRAGMA busy_timeout=30000;",
+    "PRAGMA wal_autocheckpoint=1000;",
+)
+_WAL_READY = False
+
+# One long-lived writer connection for the whole process. SQLite only has one writer anyway;
+# serialising on a lock here avoids "database is locked" retries and keeps the page cache warm.
+_WRITER: Optional[sqlite3.Connection] = None
+_WRITE_LOCK = threading.RLock()
+_WRITER_DEPTH = 0
+
+
+def _open_conn() -> sqlite3.Connection:
+    global _WAL_READY
+    # implicit transactions open with BEGIN IMMEDIATE: the write lock is taken up front instead of
+    # upgrading mid-transaction, which is where "database is locked" comes from
+    conn = sqlite3.connect(
+        DB_PATH, timeout=30, check_same_thread=False, cached_statements=256, isolation_level="IMMEDIATE"
+    )
+    conn.row_factory = sqlite3.Row
+    if not _WAL_READY:
+        conn.execute("PRAGMA journal_mode=WAL;")
+        _WAL_READY = True
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
 @contextmanager
 def db():
-    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    global _WRITER, _WRITER_DEPTH
+    with _WRITE_LOCK:
+        if _WRITER is None:
+            _WRITER = _open_conn()
+        conn = _WRITER
+        _WRITER_DEPTH += 1
+        try:
+            yield conn
+        finally:
+            _WRITER_DEPTH -= 1
+            # closing used to discard uncommitted work; keep that on the shared connection
+            if _WRITER_DEPTH == 0 and conn.in_transaction:
+                conn.rollback()
+
+
+# Read-only connections for handlers that never write. WAL lets them run alongside the writer.
+READ_POOL_SIZE = max(2, os.cpu_count() or 2)
+_READ_POOL: "queue.Queue[sqlite3.Connection]" = queue.Queue(maxsize=READ_POOL_SIZE)
+_READ_OPENED = 0
+_READ_OPEN_LOCK = threading.Lock()
+
+
+def _open_read_conn() -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        f"file:{DB_PATH}?mode=ro", uri=True, timeout=30, check_same_thread=False, cached_statements=256
+    )
     conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys=ON;")
+    conn.execute("PRAGMA query_only=ON;")
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def read_db():
+    global _READ_OPENED
+    try:
+        conn = _READ_POOL.get_nowait()
+    except queue.Empty:
+        conn = None
+        with _READ_OPEN_LOCK:
+            if _READ_OPENED < READ_POOL_SIZE:
+                _READ_OPENED += 1
+                conn = _open_read_conn()
+        if conn is None:
+            conn = _READ_POOL.get()
     try:
         yield conn
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
+        _READ_POOL.put(conn)
+
+
+def read_mostly(fn, *args):
+    # fn(conn, *args) on a reader; only if it hits a write (readonly error) rerun it on the writer.
+    # The reader cannot have changed anything, so the retry starts from the same state.
+    try:
+        with read_db() as conn:
+            return fn(conn, *args)
+    except sqlite3.OperationalError as e:
+        if e.sqlite_errorcode != sqlite3.SQLITE_READONLY:
+            raise
+    with db() as conn:
+        return fn(conn, *args)
+
+
+@contextmanager
+def write_txn(conn: sqlite3.Connection):
+    # one IMMEDIATE transaction per write endpoint: takes the write lock up front, single commit at the end.
+    # Inside a caller's open transaction it nests as a SAVEPOINT and leaves commit/rollback to the caller.
+    if conn.in_transaction:
+        conn.execute("SAVEPOINT write_txn")
+        try:
+            yield conn
+        except BaseException:
+            if conn.in_transaction:  # some errors already rolled the whole transaction back
+                conn.execute("ROLLBACK TO write_txn")
+                conn.execute("RELEASE write_txn")
+            raise
+        conn.execute("RELEASE write_txn")
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def fetch_tuples(conn: sqlite3.Connection, sql: str, params: tuple = ()) -> List[tuple]:
+    # plain tuples for hot loops: skips building a sqlite3.Row per record and name lookups per column
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur.execute(sql, params).fetchall()
 
 
 def col_exists(conn: sqlite3.Connection, table: str, col: str) -> bool:
@@ -118,12 +286,44 @@ def ensure_user_columns(conn: sqlite3.Connection) -> None:
     add_col_if_missing(conn, "users", "salt_hex", "TEXT")
     add_col_if_missing(conn, "users", "pass_hash", "TEXT")
     add_col_if_missing(conn, "users", "created_at", "TEXT")
+    # raw 16-byte salt / 32-byte PBKDF2 digest (replace the hex TEXT columns above)
+    add_col_if_missing(conn, "users", "salt_bin", "BLOB")
+    add_col_if_missing(conn, "users", "pass_bin", "BLOB")
+    add_col_if_missing(conn, "users", "pass_algo", "TEXT")
 
     # ✅ NEW
     add_col_if_missing(conn, "users", "is_admin", "INTEGER NOT NULL DEFAULT 0")
 
 
+def migrate_password_blobs(conn: sqlite3.Connection) -> None:
+    # one-shot: move hex salt/hash into the BLOB columns and clear the hex copies
+    rows = conn.execute(
+        """
+        SELECT id, salt_hex, pass_hash FROM users
+        WHERE pass_bin IS NULL AND salt_hex IS NOT NULL AND pass_hash IS NOT NULL
+        """
+    ).fetchall()
+    moved = []
+    for r in rows:
+        try:
+            moved.append((bytes.fromhex(r["salt_hex"]), bytes.fromhex(r["pass_hash"]), int(r["id"])))
+        except ValueError:
+            continue
+    if moved:
+        conn.executemany(
+            "UPDATE users SET salt_bin=?, pass_bin=?, salt_hex=NULL, pass_hash=NULL WHERE id=?",
+            moved,
+        )
+
+
+_CLOCK_TABLES_READY = False
+
+
 def ensure_clock_tables(conn: sqlite3.Connection) -> None:
+    # executescript commits and bypasses the statement cache; the DDL only needs to run once per process
+    global _CLOCK_TABLES_READY
+    if _CLOCK_TABLES_READY:
+        return
     conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS clock_state(
@@ -140,6 +340,22 @@ def ensure_clock_tables(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    _CLOCK_TABLES_READY = True
+
+
+# Column lists for the hot reads: only what the handlers actually use.
+WEEK_COLS = "id, week_number, start_date, hourly_rate"
+CLOCK_ENTRY_COLS = "id, time_in, time_out, break_minutes, extra_authorized, extra_checked"
+CLOCK_STATE_COLS = "work_date, in_time, out_time, break_running, break_start, break_minutes"
+
+# Hot clock statements, shared as constants so every call hits the connection's statement cache.
+SQL_CLOCK_STATE = f"SELECT {CLOCK_STATE_COLS} FROM clock_state WHERE user_id=?"
+SQL_TODAY_ENTRY = f"SELECT {CLOCK_ENTRY_COLS} FROM entries WHERE user_id=? AND week_id=? AND work_date=?"
+SQL_ENTRY_BY_ID = f"SELECT {CLOCK_ENTRY_COLS} FROM entries WHERE id=? AND user_id=?"
+SQL_CLOCK_STOP_BREAK = (
+    "UPDATE clock_state SET break_running=0, break_start=NULL, break_minutes=?, updated_at=? WHERE user_id=?"
+)
+SQL_ENTRY_SET_BREAK = "UPDATE entries SET break_minutes=? WHERE id=? AND user_id=?"
 
 
 def ensure_v2_tables(conn: sqlite3.Connection) -> None:
@@ -195,13 +411,95 @@ def ensure_bh_indexes(conn: sqlite3.Connection) -> None:
     )
 
 
+# True once uq_entries_user_week_date exists; entry writes fall back to SELECT-then-write without it
+_ENTRIES_UNIQUE = False
+# login/forgot email predicate: NOCASE only once ix_users_email_nocase guarantees one match
+USERS_EMAIL_WHERE = "email=?"
+
+
+def ensure_query_indexes(conn: sqlite3.Connection) -> None:
+    global _ENTRIES_UNIQUE, USERS_EMAIL_WHERE
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_entries_user_week
+        ON entries(user_id, week_id);
+
+        CREATE INDEX IF NOT EXISTS idx_weeks_user_start
+        ON weeks(user_id, start_date);
+
+        CREATE INDEX IF NOT EXISTS idx_entries_user_date
+        ON entries(user_id, work_date);
+
+        CREATE INDEX IF NOT EXISTS idx_bh_user_year
+        ON bank_holidays(user_id, year, applicable, bh_date);
+
+        CREATE INDEX IF NOT EXISTS idx_bh_user_date
+        ON bank_holidays(user_id, bh_date);
+
+        CREATE INDEX IF NOT EXISTS idx_rosters_user_start
+        ON rosters(user_id, start_date);
+
+        CREATE INDEX IF NOT EXISTS idx_roster_days_user_date
+        ON roster_days(user_id, work_date);
+
+        CREATE INDEX IF NOT EXISTS idx_roster_days_roster
+        ON roster_days(roster_id);
+        """
+    )
+
+    has_uq = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='uq_entries_user_week_date'"
+    ).fetchone()
+    if not has_uq:
+        # old DBs may hold duplicate days (user data): never delete them, just skip the unique index
+        dups = conn.execute(
+            """
+            SELECT user_id, week_id, work_date, COUNT(*) AS n
+            FROM entries
+            WHERE work_date IS NOT NULL
+            GROUP BY user_id, week_id, work_date
+            HAVING COUNT(*) > 1
+            """
+        ).fetchall()
+        if dups:
+            print(
+                "ENTRIES_DUPLICATE_DAYS: uq_entries_user_week_date not created; (user_id, week_id, work_date) =",
+                [(r["user_id"], r["week_id"], r["work_date"]) for r in dups],
+            )
+        else:
+            conn.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_entries_user_week_date
+                ON entries(user_id, week_id, work_date)
+                """
+            )
+            has_uq = True
+    _ENTRIES_UNIQUE = bool(has_uq)
+
+    has_nocase = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='index' AND name='ix_users_email_nocase'"
+    ).fetchone()
+    if not has_nocase:
+        # case-insensitive uniqueness; skipped (plain UNIQUE still applies) if old rows differ only by case
+        dup = conn.execute(
+            "SELECT 1 FROM users WHERE email IS NOT NULL GROUP BY email COLLATE NOCASE HAVING COUNT(*) > 1 LIMIT 1"
+        ).fetchone()
+        if not dup:
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email_nocase ON users(email COLLATE NOCASE)"
+            )
+            has_nocase = True
+    # case-insensitive lookups only when they can match a single row
+    USERS_EMAIL_WHERE = "email=? COLLATE NOCASE" if has_nocase else "email=?"
+
+
 def ensure_password_resets_table(conn: sqlite3.Connection) -> None:
     conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS password_resets(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             email TEXT NOT NULL,
-            token_hash TEXT NOT NULL,
+            token_hash BLOB NOT NULL,
             expires_at TEXT NOT NULL,
             created_at TEXT NOT NULL
         );
@@ -211,21 +509,51 @@ def ensure_password_resets_table(conn: sqlite3.Connection) -> None:
 
         CREATE INDEX IF NOT EXISTS ix_password_resets_token_hash
         ON password_resets(token_hash);
+
+        CREATE INDEX IF NOT EXISTS ix_password_resets_expires
+        ON password_resets(expires_at);
         """
     )
 
 
+REMINDER_DEFAULTS = {
+    "break_enabled": 1,
+    "missed_in_enabled": 1,
+    "missed_out_enabled": 1,
+    "break_reminder_after_min": 240,
+    "missed_in_offset_min": 10,
+    "missed_out_offset_min": 20,
+}
+SCHEDULE_DEFAULTS = {
+    "active_days": json.dumps([1, 2, 3, 4, 5]),
+    "start_time": "09:00",
+    "end_time": "17:00",
+    "break_after_min": 240,
+}
+
+
 def ensure_v2_defaults(conn: sqlite3.Connection, uid: int) -> None:
+    r = REMINDER_DEFAULTS
     conn.execute(
         """
         INSERT OR IGNORE INTO reminder_settings(
             user_id, break_enabled, missed_in_enabled, missed_out_enabled,
             break_reminder_after_min, missed_in_offset_min, missed_out_offset_min, updated_at
         )
-        VALUES (?, 1, 1, 1, 240, 10, 20, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
-        (uid, now()),
+        (
+            uid,
+            r["break_enabled"],
+            r["missed_in_enabled"],
+            r["missed_out_enabled"],
+            r["break_reminder_after_min"],
+            r["missed_in_offset_min"],
+            r["missed_out_offset_min"],
+            now(),
+        ),
     )
+    d = SCHEDULE_DEFAULTS
     conn.execute(
         """
         INSERT OR IGNORE INTO work_schedule(
@@ -233,7 +561,7 @@ def ensure_v2_defaults(conn: sqlite3.Connection, uid: int) -> None:
         )
         VALUES (?, ?, ?, ?, ?, ?)
         """,
-        (uid, json.dumps([1, 2, 3, 4, 5]), "09:00", "17:00", 240, now()),
+        (uid, d["active_days"], d["start_time"], d["end_time"], d["break_after_min"], now()),
     )
 
 
@@ -268,22 +596,21 @@ def parse_days_json(raw: str) -> list[int]:
     return sorted(out)
 
 
-def get_reminder_settings(conn: sqlite3.Connection, uid: int) -> sqlite3.Row:
-    ensure_v2_defaults(conn, uid)
+# read-only: users who never saved settings get the defaults instead of an INSERT on a GET
+def get_reminder_settings(conn: sqlite3.Connection, uid: int) -> sqlite3.Row | dict:
     row = conn.execute(
         "SELECT * FROM reminder_settings WHERE user_id=?",
         (uid,),
     ).fetchone()
-    return row
+    return row or REMINDER_DEFAULTS
 
 
-def get_schedule_settings(conn: sqlite3.Connection, uid: int) -> sqlite3.Row:
-    ensure_v2_defaults(conn, uid)
+def get_schedule_settings(conn: sqlite3.Connection, uid: int) -> sqlite3.Row | dict:
     row = conn.execute(
         "SELECT * FROM work_schedule WHERE user_id=?",
         (uid,),
     ).fetchone()
-    return row
+    return row or SCHEDULE_DEFAULTS
 
 
 def init_db() -> None:
@@ -419,10 +746,18 @@ def init_db() -> None:
         ensure_bh_indexes(conn)
         ensure_clock_tables(conn)
         ensure_v2_tables(conn)
+        ensure_query_indexes(conn)
+        migrate_password_blobs(conn)
         sync_tesco_week_numbers(conn)
 
         conn.commit()
 
+        # planner stats: full ANALYZE the first time, then let SQLite refresh only what drifted
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1'").fetchone():
+            conn.execute("PRAGMA optimize;")
+        else:
+            conn.execute("ANALYZE;")
+
 
 @app.on_event("startup")
 def _startup():
@@ -459,12 +794,16 @@ BANK_HOLIDAYS_2025: list[tuple[str, str]] = [
 ]
 
 
+# prebuilt year -> holidays table; add a year here and every BH endpoint picks it up
+BANK_HOLIDAYS_BY_YEAR: Dict[int, List[tuple[str, str]]] = {
+    2025: BANK_HOLIDAYS_2025,
+    2026: BANK_HOLIDAYS_2026,
+}
+BH_SUPPORTED_YEARS = tuple(sorted(BANK_HOLIDAYS_BY_YEAR))
+
+
 def irish_bank_holidays(year: int) -> List[tuple[str, str]]:
-    if year == 2025:
-        return BANK_HOLIDAYS_2025
-    if year == 2026:
-        return BANK_HOLIDAYS_2026
-    return []
+    return BANK_HOLIDAYS_BY_YEAR.get(year, [])
 
 
 def bh_repair(conn: sqlite3.Connection, uid: int, year: int) -> None:
@@ -519,25 +858,50 @@ def bh_repair(conn: sqlite3.Connection, uid: int, year: int) -> None:
     )
 
     ensure_bh_indexes(conn)
-    conn.commit()
 
 
-def ensure_bh_for_year(conn: sqlite3.Connection, uid: int, year: int) -> None:
-    bh_repair(conn, uid, year)
+# (uid, year) pairs already repaired + seeded by this process; BH rows are never deleted
+# outside bh_repair, so once a year is seeded it stays seeded.
+_BH_SEEDED: set[tuple[int, int]] = set()
+
 
-    items = irish_bank_holidays(year)
-    if not items:
+def ensure_bh_for_year(conn: sqlite3.Connection, uid: int, year: int) -> None:
+    if (uid, year) in _BH_SEEDED:
         return
 
-    conn.executemany(
-        """
-        INSERT OR IGNORE INTO bank_holidays
-        (user_id, year, name, bh_date, paid, applicable)
-        VALUES (?, ?, ?, date(?), 0, 1)
-        """,
-        [(uid, year, name, ymd) for (ymd, name) in items],
-    )
-    conn.commit()
+    # repair + seed in one IMMEDIATE transaction; only the missing dates are sent to executemany
+    with write_txn(conn):
+        bh_repair(conn, uid, year)
+
+        items = irish_bank_holidays(year)
+        if items:
+            have = {
+                r["bh_date"]
+                for r in conn.execute(
+                    "SELECT bh_date FROM bank_holidays WHERE user_id=? AND year=?",
+                    (uid, year),
+                ).fetchall()
+            }
+            missing = [(uid, year, name, ymd) for (ymd, name) in items if ymd not in have]
+            if missing:
+                conn.executemany(
+                    """
+                    INSERT OR IGNORE INTO bank_holidays
+                    (user_id, year, name, bh_date, paid, applicable)
+                    VALUES (?, ?, ?, date(?), 0, 1)
+                    """,
+                    missing,
+                )
+    if not conn.in_transaction:
+        # only memoize once committed: a caller's transaction may still roll the seed back
+        _BH_SEEDED.add((uid, year))
+
+
+def ensure_bh_year_seeded(uid: int, year: int) -> None:
+    # memo checked before taking the writer: already-seeded years never queue on _WRITE_LOCK
+    if (uid, year) not in _BH_SEEDED:
+        with db() as conn:
+            ensure_bh_for_year(conn, uid, year)
 
 
 # ======================================================
@@ -663,8 +1027,13 @@ class ScheduleSettingsUpdate(BaseModel):
 # ======================================================
 # PAGES
 # ======================================================
+def serve_page(name: str) -> FileResponse:
+    # streamed from disk with stat-based ETag/Last-Modified, no read + decode per hit
+    return FileResponse(STATIC_DIR / name, media_type="text/html")
+
+
 def serve_index() -> FileResponse:
-    return FileResponse(STATIC_DIR / "index.html")
+    return serve_page("index.html")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -679,17 +1048,17 @@ def add_week_page():
 
 @app.get("/report", response_class=HTMLResponse)
 def report():
-    return (STATIC_DIR / "report.html").read_text(encoding="utf-8")
+    return serve_page("report.html")
 
 
 @app.get("/deliveries", response_class=HTMLResponse)
 def deliveries_page():
-    return (STATIC_DIR / "deliveries.html").read_text(encoding="utf-8")
+    return serve_page("deliveries.html")
 
 
 @app.get("/settings", response_class=HTMLResponse)
 def settings_page():
-    return (STATIC_DIR / "settings.html").read_text(encoding="utf-8")
+    return serve_page("settings.html")
 
 
 @app.get("/hours", response_class=HTMLResponse)
@@ -705,7 +1074,7 @@ def weeks_page():
 @app.get("/holidays", response_class=HTMLResponse)
 def holidays_page(req: Request):
     require_user(req)
-    return (STATIC_DIR / "holidays.html").read_text(encoding="utf-8")
+    return serve_page("holidays.html")
 
 
 @app.get("/reports", response_class=HTMLResponse)
@@ -716,58 +1085,146 @@ def reports_page():
 @app.get("/profile", response_class=HTMLResponse)
 def profile_page(req: Request):
     require_user(req)
-    return (STATIC_DIR / "profile.html").read_text(encoding="utf-8")
+    return serve_page("profile.html")
 
 
 @app.get("/roster", response_class=HTMLResponse)
 def roster_page(req: Request):
     require_user(req)
-    return (STATIC_DIR / "roster.html").read_text(encoding="utf-8")
+    return serve_page("roster.html")
 
 
 # ======================================================
 # AUTH (cookie session)
 # ======================================================
-def hash_pw(pw: str, salt_hex: str) -> str:
-    return hashlib.pbkdf2_hmac(
-        "sha256",
+# fastpbkdf2 keeps the HMAC key schedule out of the loop; hashlib's SHA-256 speed (SHA-NI etc.) depends on this build
+print("PBKDF2 backend =", "fastpbkdf2" if pbkdf2_hmac.__module__.startswith("fastpbkdf2") else ssl.OPENSSL_VERSION)
+
+
+# users.pass_algo -> (digest, iterations); NULL means the original pbkdf2_sha256.
+# SHA-512 works on 64-bit words; its count follows OWASP's equivalence
+# (600k SHA-256 ~ 210k SHA-512) scaled from our 120k SHA-256.
+PASS_ALGOS: Dict[str, tuple[str, int]] = {
+    "pbkdf2_sha256": ("sha256", 120_000),
+    "pbkdf2_sha512": ("sha512", 42_000),
+}
+PASS_ALGO = "pbkdf2_sha512"
+
+
+def hash_pw(pw: str, salt: bytes, algo: str = PASS_ALGO) -> bytes:
+    digest, iterations = PASS_ALGOS[algo]
+    return pbkdf2_hmac(
+        digest,
         pw.encode("utf-8"),
-        bytes.fromhex(salt_hex),
-        120_000,
-    ).hex()
+        salt,
+        iterations,
+    )
+
+
+# PBKDF2 gets its own thread budget (one per core): a burst of logins can no longer take
+# every token of anyio's default limiter away from the sync DB endpoints
+_KDF_LIMITER = anyio.CapacityLimiter(os.cpu_count() or 2)
+
+
+async def hash_pw_async(pw: str, salt: bytes, algo: str = PASS_ALGO) -> bytes:
+    return await anyio.to_thread.run_sync(hash_pw, pw, salt, algo, limiter=_KDF_LIMITER)
 
 
-def sign(data: str) -> str:
-    return hmac.new(APP_SECRET, data.encode("utf-8"), hashlib.sha256).hexdigest()
+# keyed once: copy() clones the absorbed ipad/opad state instead of redoing the key schedule per call
+_SIGNER = hmac.new(APP_SECRET, b"", hashlib.sha256)
+
+
+# session token: base64url(uid u64 | issued_at u64 | 12 random bytes | HMAC-SHA256 of those 28 bytes).
+# Legacy "uid.ts.rnd.hexsig" cookies (they contain dots, base64url never does) still verify.
+_TOKEN_HEAD = struct.Struct("<QQ12s")
+_TOKEN_LEN = _TOKEN_HEAD.size + 32
+_TOKEN_B64_LEN = len(base64.urlsafe_b64encode(bytes(_TOKEN_LEN)))
 
 
 def make_token(uid: int) -> str:
-    ts = str(int(datetime.utcnow().timestamp()))
-    rnd = secrets.token_hex(8)
-    payload = f"{uid}.{ts}.{rnd}"
-    return f"{payload}.{sign(payload)}"
+    head = _TOKEN_HEAD.pack(uid, int(time.time()), secrets.token_bytes(12))
+    h = _SIGNER.copy()
+    h.update(head)
+    return base64.urlsafe_b64encode(head + h.digest()).decode("ascii")
 
 
-def verify_token(tok: str) -> Optional[int]:
-    try:
-        uid, ts, rnd, sig = tok.split(".")
-        payload = f"{uid}.{ts}.{rnd}"
-        if not hmac.compare_digest(sig, sign(payload)):
+# sha256(token) -> (uid, token expiry, cached_until). Keyed by digest so raw bearer tokens
+# never sit in memory; the short TTL bounds how long a verdict is reused without the HMAC.
+# Ordered by insert time: stale and overflow entries are popped from the front under _SESSION_LOCK.
+SESSION_CACHE_TTL = 5.0
+SESSION_CACHE_MAX = 10_000
+_SESSION_CACHE: "OrderedDict[bytes, tuple[int, int, float]]" = OrderedDict()
+_SESSION_LOCK = threading.Lock()
+
+
+def _verify_token_sig(tok: str) -> Optional[tuple[int, int]]:
+    # (uid, issued_at) for a correctly signed token, else None.
+    # Shape checks come first so malformed cookies are rejected without exceptions or an HMAC.
+    if not tok.isascii():
+        return None
+    if "." not in tok:
+        if len(tok) != _TOKEN_B64_LEN:
             return None
-        if datetime.utcnow().timestamp() - int(ts) > COOKIE_AGE:
+        try:
+            raw = base64.urlsafe_b64decode(tok)
+        except (ValueError, binascii.Error):
             return None
-        return int(uid)
-    except Exception:
+        h = _SIGNER.copy()
+        h.update(raw[:_TOKEN_HEAD.size])
+        if not hmac.compare_digest(h.digest(), raw[_TOKEN_HEAD.size:]):
+            return None
+        uid, issued, _ = _TOKEN_HEAD.unpack_from(raw)
+        return uid, issued
+
+    if tok.count(".") != 3:
+        return None
+    uid, ts, rnd, sig = tok.split(".")
+    if len(sig) != 64 or not uid.isdigit() or not ts.isdigit():
+        return None
+    h = _SIGNER.copy()
+    h.update(f"{uid}.{ts}.{rnd}".encode("ascii"))
+    if not hmac.compare_digest(sig, h.hexdigest()):
+        return None
+    return int(uid), int(ts)
+
+
+def verify_token(tok: str) -> Optional[int]:
+    key = hashlib.sha256(tok.encode("utf-8")).digest()
+    now_ts = time.time()
+    t = time.monotonic()
+    hit = _SESSION_CACHE.get(key)
+    if hit and hit[2] > t and now_ts <= hit[1]:
+        return hit[0]
+
+    signed = _verify_token_sig(tok)
+    if not signed:
+        return None
+    uid, issued = signed
+    if now_ts - issued > COOKIE_AGE:
         return None
 
+    with _SESSION_LOCK:
+        _SESSION_CACHE[key] = (uid, issued + COOKIE_AGE, t + SESSION_CACHE_TTL)
+        _SESSION_CACHE.move_to_end(key)
+        # drop expired entries and anything over the cap, oldest first
+        while _SESSION_CACHE and (
+            len(_SESSION_CACHE) > SESSION_CACHE_MAX or next(iter(_SESSION_CACHE.values()))[2] <= t
+        ):
+            _SESSION_CACHE.popitem(last=False)
+    return uid
+
 
 def require_user(req: Request) -> int:
     tok = req.cookies.get("wh_session")
     uid = verify_token(tok) if tok else None
     if not uid:
         raise HTTPException(401, "Unauthorized")
-    with db() as conn:
-        ensure_current_week_for_user(conn, uid)
+    # the current week almost always exists already: check on a reader, only take the writer to create it
+    with read_db() as conn:
+        has_week = current_week_exists(conn, uid)
+    if not has_week:
+        with db() as conn:
+            ensure_current_week_for_user(conn, uid)
     return uid
 
 
@@ -798,13 +1255,47 @@ SMTP_USER = os.environ.get("SMTP_USER", "")
 SMTP_PASS = os.environ.get("SMTP_PASS", "")
 SMTP_FROM = os.environ.get("SMTP_FROM", SMTP_USER or "no-reply@example.com")
 SMTP_TLS = os.environ.get("SMTP_TLS", "1") == "1"
+SMTP_CONFIGURED = bool(SMTP_HOST and SMTP_USER and SMTP_PASS)
 
 APP_BASE_URL = os.environ.get("APP_BASE_URL", "").strip().rstrip("/")
 print("APP_BASE_URL =", APP_BASE_URL)
 
 
+# one logged-in SMTP session reused across sends (checked with NOOP first), instead of
+# TCP + STARTTLS + AUTH per reset email
+_SMTP_CONN: Optional[smtplib.SMTP] = None
+_SMTP_LOCK = threading.Lock()
+
+
+def _smtp_connect() -> smtplib.SMTP:
+    s = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20)
+    try:
+        if SMTP_TLS:
+            s.starttls()
+        s.login(SMTP_USER, SMTP_PASS)
+    except BaseException:
+        s.close()
+        raise
+    return s
+
+
+def _smtp_close() -> None:
+    global _SMTP_CONN
+    s, _SMTP_CONN = _SMTP_CONN, None
+    if s is None:
+        return
+    try:
+        s.quit()
+    except Exception:
+        s.close()
+
+
+# QUIT the pooled session on interpreter shutdown instead of dropping the socket
+atexit.register(_smtp_close)
+
+
 def send_email(to_email: str, subject: str, text: str) -> None:
-    if not SMTP_HOST or not SMTP_USER or not SMTP_PASS:
+    if not SMTP_CONFIGURED:
         raise RuntimeError("SMTP not configured (missing SMTP_HOST/SMTP_USER/SMTP_PASS)")
 
     msg = EmailMessage()
@@ -813,11 +1304,22 @@ def send_email(to_email: str, subject: str, text: str) -> None:
     msg["Subject"] = subject
     msg.set_content(text)
 
-    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=20) as s:
-        if SMTP_TLS:
-            s.starttls()
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
+    global _SMTP_CONN
+    with _SMTP_LOCK:
+        if _SMTP_CONN is not None:
+            try:
+                if _SMTP_CONN.noop()[0] != 250:
+                    _smtp_close()
+            except (smtplib.SMTPException, OSError):
+                _smtp_close()
+        if _SMTP_CONN is None:
+            _SMTP_CONN = _smtp_connect()
+        try:
+            _SMTP_CONN.send_message(msg)
+        except BaseException:
+            # unknown session state: next send starts from a fresh connection
+            _smtp_close()
+            raise
 
 
 # ======================================================
@@ -829,7 +1331,7 @@ from fastapi import HTTPException, Request
 def admin_users(request: Request):
     uid = require_user(request)
 
-    with db() as conn:
+    with read_db() as conn:
         me = conn.execute(
             "SELECT is_admin FROM users WHERE id = ?",
             (uid,)
@@ -866,59 +1368,69 @@ def admin_page(req: Request):
     return FileResponse(STATIC_DIR / "admin.html")
 
 
-@app.post("/api/signup")
-def signup(p: SignupIn):
-    salt_hex = secrets.token_hex(16)
-    pw_hash = hash_pw(p.password, salt_hex)
-
+def create_user(p: SignupIn, salt: bytes, pw_hash: bytes) -> int:
     with db() as conn:
         try:
-            conn.execute(
+            cur = conn.execute(
                 """
-                INSERT INTO users(first_name,last_name,email,salt_hex,pass_hash,avatar_path,created_at)
-                VALUES (?,?,?,?,?,?,?)
+                INSERT INTO users(first_name,last_name,email,salt_bin,pass_bin,pass_algo,avatar_path,created_at)
+                VALUES (?,?,?,?,?,?,?,?)
                 """,
                 (
                     p.first_name.strip(),
                     p.last_name.strip(),
                     p.email.lower().strip(),
-                    salt_hex,
+                    salt,
                     pw_hash,
+                    PASS_ALGO,
                     None,
                     now(),
                 ),
             )
+            uid = cur.lastrowid
             conn.commit()
         except sqlite3.IntegrityError:
             raise HTTPException(400, "Email already registered")
+    return uid
+
 
-        uid = conn.execute(
-            "SELECT id FROM users WHERE email=?",
-            (p.email.lower().strip(),),
-        ).fetchone()["id"]
+@app.post("/api/signup")
+async def signup(p: SignupIn):
+    # PBKDF2 and the insert run on worker threads; the hash holds no connection
+    salt = secrets.token_bytes(16)
+    pw_hash = await hash_pw_async(p.password, salt)
+    uid = await anyio.to_thread.run_sync(create_user, p, salt, pw_hash)
 
     resp = JSONResponse({"ok": True})
     set_cookie(resp, make_token(uid), remember=True)
     return resp
 
 
+def find_login_user(email: str) -> Optional[sqlite3.Row]:
+    with read_db() as conn:
+        return conn.execute(
+            f"SELECT id, salt_bin, pass_bin, pass_algo FROM users WHERE {USERS_EMAIL_WHERE}",
+            (email,),
+        ).fetchone()
+
+
 @app.post("/api/login")
-def login(p: LoginIn):
-    
-    with db() as conn:
-        u = conn.execute("SELECT * FROM users WHERE email=?", (p.email.lower().strip(),)).fetchone()
-        if not u:
-            raise HTTPException(401, "Invalid credentials")
+async def login(p: LoginIn):
+    # lookup and PBKDF2 run on worker threads; the hash no longer holds a connection (or the write lock)
+    u = await anyio.to_thread.run_sync(find_login_user, p.email.lower().strip())
+    if not u:
+        raise HTTPException(401, "Invalid credentials")
 
-        salt_hex = u["salt_hex"]
-        pass_hash = u["pass_hash"]
-        if not salt_hex or not pass_hash:
-            raise HTTPException(500, "DB mismatch: user missing password fields")
+    salt = u["salt_bin"]
+    pass_bin = u["pass_bin"]
+    algo = u["pass_algo"] or "pbkdf2_sha256"
+    if not salt or not pass_bin or algo not in PASS_ALGOS:
+        raise HTTPException(500, "DB mismatch: user missing password fields")
 
-        if hash_pw(p.password, salt_hex) != pass_hash:
-            raise HTTPException(401, "Invalid credentials")
+    if not hmac.compare_digest(await hash_pw_async(p.password, salt, algo), pass_bin):
+        raise HTTPException(401, "Invalid credentials")
 
-        uid = int(u["id"])
+    uid = int(u["id"])
 
     resp = JSONResponse({"ok": True})
     set_cookie(resp, make_token(uid), remember=p.remember)
@@ -936,10 +1448,23 @@ def logout():
     return r
 
 
-@app.get("/api/me")
-def me(req: Request):
-    uid = require_user(req)
-    with db() as conn:
+# uid -> (/api/me payload, expires_at). Cleared per user by me_patch / avatar upload;
+# the TTL bounds staleness when several processes share the db (same scheme as _MULT_CACHE).
+PROFILE_CACHE_TTL = 60.0
+_PROFILE_CACHE: Dict[int, tuple[dict, float]] = {}
+
+
+def invalidate_profile_cache(uid: int) -> None:
+    _PROFILE_CACHE.pop(uid, None)
+
+
+def user_profile(uid: int) -> Optional[dict]:
+    hit = _PROFILE_CACHE.get(uid)
+    t = time.monotonic()
+    if hit and hit[1] > t:
+        return hit[0]
+
+    with read_db() as conn:
         u = conn.execute(
             """
             SELECT id, email, first_name, last_name, hourly_rate, avatar_path, is_admin
@@ -948,24 +1473,30 @@ def me(req: Request):
             """,
             (uid,),
         ).fetchone()
+    if not u:
+        return None
 
-        
+    profile = {
+        "ok": True,
+        "id": int(u["id"]),
+        "email": u["email"],
+        "first_name": u["first_name"] or "",
+        "last_name": u["last_name"] or "",
+        "hourly_rate": float(u["hourly_rate"] or 0),
+        "avatar_url": u["avatar_path"] or "",
+        "is_admin": int(u["is_admin"] or 0),
+    }
+    _PROFILE_CACHE[uid] = (profile, t + PROFILE_CACHE_TTL)
+    return profile
 
-        if not u:
-            raise HTTPException(401, "Not logged")
-        
-        
 
-        return {
-            "ok": True,
-            "id": int(u["id"]),
-            "email": u["email"],
-            "first_name": u["first_name"] or "",
-            "last_name": u["last_name"] or "",
-            "hourly_rate": float(u["hourly_rate"] or 0),
-            "avatar_url": u["avatar_path"] or "",
-            "is_admin": int(u["is_admin"] or 0),
-        }
+@app.get("/api/me")
+def me(req: Request):
+    uid = require_user(req)
+    profile = user_profile(uid)
+    if not profile:
+        raise HTTPException(401, "Not logged")
+    return dict(profile)
 
 
 
@@ -988,6 +1519,7 @@ def me_patch(p: MeUpdate, req: Request):
             conn.execute("UPDATE users SET hourly_rate=? WHERE id=?", (hr, uid))
 
         conn.commit()
+    invalidate_profile_cache(uid)
 
     return {"ok": True}
 
@@ -995,53 +1527,66 @@ def me_patch(p: MeUpdate, req: Request):
 # ======================================================
 # FORGOT / RESET
 # ======================================================
-def sha256_hex(s: str) -> str:
-    return hashlib.sha256(s.encode("utf-8")).hexdigest()
+def reset_token_hash(s: str) -> bytes:
+    # raw 32-byte SHA-256 digest; stored as a BLOB in password_resets.token_hash
+    return hashlib.sha256(s.encode("utf-8")).digest()
+
+
+RESET_EMAIL_SUBJECT = "Reset your Work Hours Tracker password"
+RESET_EMAIL_TEMPLATE = "Use this link to reset your password (valid for 30 minutes):\n\n{link}\n"
+
+
+def send_reset_email(email: str, reset_link: str) -> None:
+    # runs as a background task after the response went out: failures can only be logged
+    try:
+        send_email(
+            to_email=email,
+            subject=RESET_EMAIL_SUBJECT,
+            text=RESET_EMAIL_TEMPLATE.format(link=reset_link),
+        )
+    except Exception as e:
+        print("EMAIL_SEND_FAILED:", repr(e))
 
 
 @app.post("/api/forgot")
-def forgot(p: ForgotIn):
+def forgot(p: ForgotIn, background: BackgroundTasks):
     email = p.email.lower().strip()
 
-    with db() as conn:
-        u = conn.execute("SELECT id FROM users WHERE email=?", (email,)).fetchone()
-        if not u:
-            return {"ok": True}
+    # the lookup runs on a reader: unknown emails never touch the write lock
+    with read_db() as conn:
+        u = conn.execute(f"SELECT id, email FROM users WHERE {USERS_EMAIL_WHERE}", (email,)).fetchone()
+    if not u:
+        return {"ok": True}
+    # the reset is tied to the stored address, which the final UPDATE matches exactly
+    email = u["email"]
 
-        if not APP_BASE_URL:
-            raise HTTPException(500, "APP_BASE_URL not configured")
+    if not APP_BASE_URL:
+        raise HTTPException(500, "APP_BASE_URL not configured")
 
-        token = secrets.token_urlsafe(32)
-        token_hash = sha256_hex(token)
-        expires_at = (datetime.utcnow() + timedelta(minutes=30)).isoformat(timespec="seconds")
+    token = secrets.token_urlsafe(32)
+    token_hash = reset_token_hash(token)
+    issued = datetime.utcnow()
+    expires_at = (issued + timedelta(minutes=30)).isoformat(timespec="seconds")
 
-        conn.execute("DELETE FROM password_resets WHERE email=?", (email,))
+    with db() as conn, write_txn(conn):
+        # drop this user's old token and anyone's expired ones, so the token_hash index only holds live rows
+        conn.execute(
+            "DELETE FROM password_resets WHERE email=? OR expires_at < ?",
+            (email, issued.isoformat(timespec="seconds")),
+        )
         conn.execute(
             "INSERT INTO password_resets(email, token_hash, expires_at, created_at) VALUES (?,?,?,?)",
             (email, token_hash, expires_at, now()),
         )
-        conn.commit()
 
     reset_link = f"{APP_BASE_URL}/?reset={token}"
-
-    try:
-        send_email(
-            to_email=email,
-            subject="Reset your Work Hours Tracker password",
-            text=f"Use this link to reset your password (valid for 30 minutes):\n\n{reset_link}\n",
-        )
-    except Exception as e:
-        print("EMAIL_SEND_FAILED:", repr(e))
-        raise HTTPException(500, "Failed to send reset email")
+    background.add_task(send_reset_email, email, reset_link)
 
     return {"ok": True}
 
 
-@app.post("/api/reset")
-def reset(p: ResetIn):
-    tok = p.token.strip()
-    token_hash = sha256_hex(tok)
-
+def check_reset_token(token_hash: bytes) -> str:
+    # cheap checks first, so a bad or expired token never costs a PBKDF2
     with db() as conn:
         row = conn.execute(
             "SELECT email, expires_at FROM password_resets WHERE token_hash=? LIMIT 1",
@@ -1057,18 +1602,34 @@ def reset(p: ResetIn):
             conn.commit()
             raise HTTPException(400, "Token expired")
 
-        email = row["email"]
+        return row["email"]
 
-        new_salt = secrets.token_hex(16)
-        new_hash = hash_pw(p.new_password, new_salt)
+
+def apply_password_reset(token_hash: bytes, email: str, new_salt: bytes, new_hash: bytes) -> None:
+    with db() as conn, write_txn(conn):
+        # consume the token in the same transaction as the update; a concurrent reset with it loses here
+        if not conn.execute(
+            "DELETE FROM password_resets WHERE token_hash=? RETURNING id",
+            (token_hash,),
+        ).fetchone():
+            raise HTTPException(400, "Invalid or expired token")
 
         conn.execute(
-            "UPDATE users SET salt_hex=?, pass_hash=? WHERE email=?",
-            (new_salt, new_hash, email),
+            "UPDATE users SET salt_bin=?, pass_bin=?, pass_algo=?, salt_hex=NULL, pass_hash=NULL WHERE email=?",
+            (new_salt, new_hash, PASS_ALGO, email),
         )
 
-        conn.execute("DELETE FROM password_resets WHERE token_hash=?", (token_hash,))
-        conn.commit()
+
+@app.post("/api/reset")
+async def reset(p: ResetIn):
+    tok = p.token.strip()
+    token_hash = reset_token_hash(tok)
+
+    email = await anyio.to_thread.run_sync(check_reset_token, token_hash)
+
+    new_salt = secrets.token_bytes(16)
+    new_hash = await hash_pw_async(p.new_password, new_salt)
+    await anyio.to_thread.run_sync(apply_password_reset, token_hash, email, new_salt, new_hash)
 
     return {"ok": True}
 
@@ -1076,34 +1637,72 @@ def reset(p: ResetIn):
 # ======================================================
 # AVATAR (single correct endpoint)
 # ======================================================
+AVATAR_MAX_BYTES = 5_000_000
+AVATAR_CHUNK_BYTES = 64 * 1024
+
+
+def sniff_image_ext(head: bytes) -> Optional[str]:
+    # trust the file's magic bytes, not the client's content-type
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
 @app.post("/api/me/avatar")
 async def upload_avatar(req: Request, file: UploadFile = File(...)):
-    uid = require_user(req)
+    # db() blocks on the writer lock, so keep it off the event loop
+    uid = await anyio.to_thread.run_sync(require_user, req)
 
-    if file.content_type not in ("image/jpeg", "image/png", "image/webp"):
+    head = await file.read(AVATAR_CHUNK_BYTES)
+    ext = sniff_image_ext(head)
+    if not ext:
         raise HTTPException(400, "Invalid image (use jpg/png/webp)")
 
-    data = await file.read()
-    if len(data) > 5_000_000:
-        raise HTTPException(400, "Image too large (max 5MB)")
-
-    ext = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}[file.content_type]
     fname = f"user_{uid}.{ext}"
-    (AVATARS_DIR / fname).write_bytes(data)
+    # unique per upload: two concurrent uploads by the same user must not share a temp file
+    part_path = AVATARS_DIR / f".{fname}.{secrets.token_hex(8)}.part"
+
+    # stream to a temp file so an oversized upload never replaces the current avatar
+    replaced = False
+    try:
+        total = 0
+        async with await anyio.open_file(part_path, "wb") as f:
+            chunk = head
+            while chunk:
+                total += len(chunk)
+                if total > AVATAR_MAX_BYTES:
+                    raise HTTPException(400, "Image too large (max 5MB)")
+                await f.write(chunk)
+                chunk = await file.read(AVATAR_CHUNK_BYTES)
+        await anyio.to_thread.run_sync(os.replace, part_path, AVATARS_DIR / fname)
+        replaced = True
+    finally:
+        if not replaced:
+            # filesystem I/O stays off the event loop, even when the request was cancelled
+            with anyio.CancelScope(shield=True):
+                await anyio.to_thread.run_sync(lambda: part_path.unlink(missing_ok=True))
 
     url = f"/uploads/avatars/{fname}"
+    await anyio.to_thread.run_sync(set_avatar_path, uid, url)
+
+    return {"ok": True, "avatar_url": url}
 
+
+def set_avatar_path(uid: int, url: str) -> None:
     with db() as conn:
         conn.execute("UPDATE users SET avatar_path=? WHERE id=?", (url, uid))
         conn.commit()
-
-    return {"ok": True, "avatar_url": url}
+    invalidate_profile_cache(uid)
 
 
 @app.get("/uploads/avatars/{fname}")
 def get_avatar(fname: str, req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         row = conn.execute(
             "SELECT avatar_path FROM users WHERE id=?",
             (uid,),
@@ -1283,7 +1882,20 @@ def minutes_paid_between(
 PUBLIC_HOLIDAY_MULT = float(os.environ.get("PUBLIC_HOLIDAY_MULT", "1.0787"))
 
 
+def _hhmm_digits_min(text: str) -> Optional[int]:
+    # "HH:MM" straight from the character codes: no slicing, no int(); None unless 4 ASCII digits
+    if len(text) != 5 or text[2] != ":":
+        return None
+    a, b, c, d = ord(text[0]) - 48, ord(text[1]) - 48, ord(text[3]) - 48, ord(text[4]) - 48
+    if 0 <= a <= 9 and 0 <= b <= 9 and 0 <= c <= 9 and 0 <= d <= 9:
+        return (a * 10 + b) * 60 + c * 10 + d
+    return None
+
+
 def hhmm_to_min(hhmm: str) -> int:
+    m = _hhmm_digits_min(hhmm)
+    if m is not None:
+        return m
     h, m = hhmm.split(":")
     return int(h) * 60 + int(m)
 
@@ -1303,23 +1915,56 @@ def _parse_hhmm_naive(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def parse_hhmm_min(value: Optional[str]) -> Optional[int]:
+    # lenient like _parse_hhmm_naive, but skips strptime for the usual "HH:MM"
+    text = str(value or "").strip()[:5]
+    m = _hhmm_digits_min(text)
+    if m is not None:
+        return m if m < 1440 and text[3] < "6" else None
+    dt = _parse_hhmm_naive(text)
+    return dt.hour * 60 + dt.minute if dt else None
+
+
+def net_minutes(in_m: int, out_m: int, break_m: int) -> int:
+    # integer-only calc kernel: overnight shifts wrap, never negative
+    gross = out_m - in_m
+    if gross < 0:
+        gross += 24 * 60
+    return max(0, gross - break_m)
+
+
+# shift constants as minutes, computed once at import
+_SHIFT_A_IN_M = hhmm_to_min(SHIFT_A_IN)
+_SHIFT_A_OUT_M = hhmm_to_min(SHIFT_A_OUT)
+_SHIFT_B_IN_M = hhmm_to_min(SHIFT_B_IN)
+_SHIFT_B_OUT_M = hhmm_to_min(SHIFT_B_OUT)
+_SHIFT_THRESHOLD_M = hhmm_to_min("10:15")
+
+
+def detect_shift_min(in_m: int) -> tuple[int, int]:
+    if in_m <= _SHIFT_THRESHOLD_M:
+        return _SHIFT_A_IN_M, _SHIFT_A_OUT_M
+    return _SHIFT_B_IN_M, _SHIFT_B_OUT_M
+
+
 def detect_shift(time_in: Optional[str]):
     if not time_in:
         return None
-    t = hhmm_to_min(time_in)
-    if t <= hhmm_to_min("10:15"):
+    if hhmm_to_min(time_in) <= _SHIFT_THRESHOLD_M:
         return (SHIFT_A_IN, SHIFT_A_OUT)
     return (SHIFT_B_IN, SHIFT_B_OUT)
 
 
-def apply_tolerance(real: str, official: str) -> int:
-    real_m = hhmm_to_min(real)
-    off_m = hhmm_to_min(official)
+def apply_tolerance_min(real_m: int, off_m: int) -> int:
     if abs(real_m - off_m) <= TOLERANCE_MIN:
         return off_m
     return real_m
 
 
+def apply_tolerance(real: str, official: str) -> int:
+    return apply_tolerance_min(hhmm_to_min(real), hhmm_to_min(official))
+
+
 def effective_break_minutes(t_in: Optional[str], t_out: Optional[str], break_real: int) -> int:
     if not t_in or not t_out:
         return 0
@@ -1336,21 +1981,119 @@ def compute_week_entry_summary(
     if not time_in or not time_out:
         return None, 0.0
 
-    in_dt = _parse_hhmm_naive(time_in)
-    out_dt = _parse_hhmm_naive(time_out)
-    if not in_dt or not out_dt:
+    in_m = parse_hhmm_min(time_in)
+    out_m = parse_hhmm_min(time_out)
+    if in_m is None or out_m is None:
         return None, 0.0
 
-    gross_minutes = int((out_dt - in_dt).total_seconds() / 60)
-    if gross_minutes < 0:
-        gross_minutes += 24 * 60
+    mins = net_minutes(in_m, out_m, int(break_minutes or 0))
+    gross_pay = (mins / 60.0) * float(hourly_rate or 0.0) * float(multiplier or 1.0)
+    return mins, gross_pay
+
+
+def _entry_net_min(in_m: Optional[int], out_m: Optional[int], break_m: Optional[int]) -> Optional[int]:
+    if in_m is None or out_m is None:
+        return None
+    return net_minutes(in_m, out_m, int(break_m or 0))
+
+
+def summarize_entries(rows: List[tuple], hourly_rate: float) -> tuple[List[Optional[int]], List[float]]:
+    """
+    Column-wise compute_week_entry_summary over entry rows of one week:
+    returns per-row minutes (None when incomplete) and pay.
+    Rows are plain tuples starting (time_in, time_out, break_minutes, multiplier, raw_min);
+    raw_min comes from SQL_ENTRY_RAW_MIN, so only its NULLs are parsed here.
+    """
+    mins = [
+        r[4] if r[4] is not None
+        else _entry_net_min(parse_hhmm_min(r[0]), parse_hhmm_min(r[1]), r[2])
+        for r in rows
+    ]
+    rate = float(hourly_rate or 0.0)
+    pays = [
+        (m / 60.0) * rate * float(r[3] or 1.0) if m is not None else 0.0
+        for m, r in zip(mins, rows)
+    ]
+    return mins, pays
+
+
+# SQL mirror of compute_week_entry_summary for entries aliased "e" joined to weeks "w".
+# Only canonical "HH:MM" values are computed in SQL; anything else goes through the Python helper.
+def _sql_hhmm_min(col: str) -> str:
+    return f"(CAST(substr({col},1,2) AS INTEGER)*60 + CAST(substr({col},4,2) AS INTEGER))"
+
+
+def _sql_hhmm_ok(col: str) -> str:
+    return f"(substr({col},1,5) GLOB '[0-2][0-9]:[0-5][0-9]' AND substr({col},1,2) < '24')"
+
+
+SQL_ENTRY_HHMM_OK = f"{_sql_hhmm_ok('e.time_in')} AND {_sql_hhmm_ok('e.time_out')}"
+SQL_ENTRY_MINUTES = (
+    f"MAX(0, {_sql_hhmm_min('e.time_out')} - {_sql_hhmm_min('e.time_in')}"
+    f" + CASE WHEN {_sql_hhmm_min('e.time_out')} < {_sql_hhmm_min('e.time_in')} THEN 1440 ELSE 0 END"
+    f" - COALESCE(e.break_minutes, 0))"
+)
+SQL_ENTRY_PAY = (
+    f"({SQL_ENTRY_MINUTES}) / 60.0 * COALESCE(w.hourly_rate, 0) * COALESCE(NULLIF(e.multiplier, 0), 1.0)"
+)
+# per-row net minutes, NULL when incomplete or non-canonical (summarize_entries parses those)
+SQL_ENTRY_RAW_MIN = f"CASE WHEN {SQL_ENTRY_HHMM_OK} THEN {SQL_ENTRY_MINUTES} END"
+
+
+SQL_ENTRY_TOTALS = f"""
+    SELECT
+        COALESCE(SUM(mins), 0) AS all_min,
+        COALESCE(SUM(pay), 0.0) AS all_pay,
+        COALESCE(SUM(CASE WHEN week_id=? THEN mins END), 0) AS week_min,
+        COALESCE(SUM(CASE WHEN week_id=? THEN pay END), 0.0) AS week_pay
+    FROM (
+        SELECT w.id AS week_id, {SQL_ENTRY_MINUTES} AS mins, {SQL_ENTRY_PAY} AS pay
+        FROM weeks w
+        JOIN entries e ON e.week_id=w.id AND e.user_id=w.user_id
+        WHERE w.user_id=? AND {SQL_ENTRY_HHMM_OK}
+    )
+"""
+
+SQL_ENTRY_TOTALS_ODD = f"""
+    SELECT w.id AS week_id, w.hourly_rate, e.time_in, e.time_out, e.break_minutes, e.multiplier
+    FROM weeks w
+    JOIN entries e ON e.week_id=w.id AND e.user_id=w.user_id
+    WHERE w.user_id=? AND e.time_in IS NOT NULL AND e.time_out IS NOT NULL
+      AND NOT ({SQL_ENTRY_HHMM_OK})
+"""
 
-    net_minutes = gross_minutes - int(break_minutes or 0)
-    if net_minutes < 0:
-        net_minutes = 0
 
-    gross_pay = (net_minutes / 60.0) * float(hourly_rate or 0.0) * float(multiplier or 1.0)
-    return int(net_minutes), gross_pay
+def entry_totals(conn: sqlite3.Connection, uid: int, week_id: Optional[int]) -> tuple[int, float, int, float]:
+    """
+    Returns (all_minutes, all_pay, week_minutes, week_pay) over every week of the user,
+    aggregated inside SQLite instead of walking the entries in Python.
+    """
+    r = conn.execute(
+        SQL_ENTRY_TOTALS,
+        (week_id, week_id, uid),
+    ).fetchone()
+    all_min, all_pay = int(r["all_min"]), float(r["all_pay"])
+    week_min, week_pay = int(r["week_min"]), float(r["week_pay"])
+
+    # non-canonical times (e.g. "9:45") keep the lenient Python parser
+    odd = conn.execute(
+        SQL_ENTRY_TOTALS_ODD,
+        (uid,),
+    ).fetchall()
+    for o in odd:
+        m, pay = compute_week_entry_summary(
+            o["time_in"], o["time_out"], int(o["break_minutes"] or 0),
+            float(o["hourly_rate"] or 0.0), float(o["multiplier"] or 1.0),
+        )
+        if m is None:
+            continue
+        all_min += m
+        all_pay += pay
+        if week_id is not None and int(o["week_id"]) == int(week_id):
+            week_min += m
+            week_pay += pay
+
+    return all_min, all_pay, week_min, week_pay
 
 def clamp(v: int, lo: int, hi: int) -> int:
     return max(lo, min(hi, v))
@@ -1363,13 +2106,10 @@ def calc_paid_times_authorized(t_in: Optional[str], t_out: Optional[str]) -> dic
     if not t_in or not t_out:
         return {"paid_in_hhmm": "", "paid_out_hhmm": ""}
 
-    shift = detect_shift(t_in)
-    if not shift:
-        return {"paid_in_hhmm": t_in, "paid_out_hhmm": t_out}
-
-    shift_in, shift_out = shift
-    paid_in_m = apply_tolerance(t_in, shift_in)
-    paid_out_m = apply_tolerance(t_out, shift_out)
+    in_real = hhmm_to_min(t_in)
+    shift_in_m, shift_out_m = detect_shift_min(in_real)
+    paid_in_m = apply_tolerance_min(in_real, shift_in_m)
+    paid_out_m = apply_tolerance_min(hhmm_to_min(t_out), shift_out_m)
 
     return {"paid_in_hhmm": min_to_hhmm(paid_in_m), "paid_out_hhmm": min_to_hhmm(paid_out_m)}
 
@@ -1392,8 +2132,8 @@ def calc_paid_times_roster(conn: sqlite3.Connection, uid: int, work_date: str,
     off_in_m = hhmm_to_min(off_in)
     off_out_m = hhmm_to_min(off_out)
 
-    paid_in_m = apply_tolerance(t_in, off_in)
-    paid_out_m = apply_tolerance(t_out, off_out)
+    paid_in_m = apply_tolerance_min(hhmm_to_min(t_in), off_in_m)
+    paid_out_m = apply_tolerance_min(hhmm_to_min(t_out), off_out_m)
 
     # clamp to roster window (no early/late paid time)
     paid_in_m = clamp(paid_in_m, off_in_m, off_out_m)
@@ -1407,13 +2147,10 @@ def minutes_between(work_date: str, t_in: Optional[str], t_out: Optional[str], b
     if not t_in or not t_out:
         return 0
 
-    shift = detect_shift(t_in)
-    if not shift:
-        return 0
-
-    shift_in, shift_out = shift
-    in_m = apply_tolerance(t_in, shift_in)
-    out_m = apply_tolerance(t_out, shift_out)
+    in_real = hhmm_to_min(t_in)
+    shift_in_m, shift_out_m = detect_shift_min(in_real)
+    in_m = apply_tolerance_min(in_real, shift_in_m)
+    out_m = apply_tolerance_min(hhmm_to_min(t_out), shift_out_m)
 
     if out_m < in_m:
         out_m += 24 * 60
@@ -1446,8 +2183,20 @@ def ddmmyyyy(d: date) -> str:
     return f"{d.day:02d}/{d.month:02d}/{d.year}"
 
 
+WEEKDAY_EN = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+
 def weekday_short_en(d: date) -> str:
-    return ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"][d.weekday()]
+    return WEEKDAY_EN[d.weekday()]
+
+
+def ymd_labels(ymd: str) -> tuple[str, str]:
+    # (weekday, dd/mm/yyyy) straight from "YYYY-MM-DD" slices; other shapes go through parse_ymd
+    if len(ymd) == 10 and ymd[4] == "-" and ymd[7] == "-":
+        weekday = WEEKDAY_EN[date(int(ymd[0:4]), int(ymd[5:7]), int(ymd[8:10])).weekday()]
+        return weekday, f"{ymd[8:10]}/{ymd[5:7]}/{ymd[0:4]}"
+    d = parse_ymd(ymd)
+    return weekday_short_en(d), ddmmyyyy(d)
 
 
 def today_ymd() -> str:
@@ -1546,49 +2295,54 @@ def create_week_record(
 ) -> sqlite3.Row:
     normalized_start = sunday_start(parse_ymd(start_date)).isoformat()
     _fiscal_year, week_number = tesco_fiscal_week(parse_ymd(normalized_start))
-    conn.execute(
-        "INSERT INTO weeks(user_id,week_number,start_date,hourly_rate,created_at) VALUES (?,?,?,?,?)",
+    row = conn.execute(
+        f"INSERT INTO weeks(user_id,week_number,start_date,hourly_rate,created_at) VALUES (?,?,?,?,?) RETURNING {WEEK_COLS}",
         (uid, int(week_number), normalized_start, float(hourly_rate), now()),
-    )
-    conn.commit()
-    return conn.execute(
-        "SELECT * FROM weeks WHERE user_id=? AND start_date=? ORDER BY id DESC LIMIT 1",
-        (uid, normalized_start),
     ).fetchone()
+    conn.commit()
+    return row
 
 
-def ensure_current_week_for_user(conn: sqlite3.Connection, uid: int) -> Optional[sqlite3.Row]:
-    today = local_now().date()
-    weeks = conn.execute(
-        "SELECT * FROM weeks WHERE user_id=? ORDER BY date(start_date) ASC, id ASC",
-        (uid,),
-    ).fetchall()
+# start_date is always stored as YYYY-MM-DD, so these compare as strings on idx_weeks_user_start
+SQL_CURRENT_WEEK = f"""
+    SELECT {WEEK_COLS} FROM weeks
+    WHERE user_id=? AND start_date <= ? AND start_date >= ?
+    ORDER BY start_date ASC, id ASC
+    LIMIT 1
+"""
 
-    if not weeks:
-        start = sunday_start(today)
-        return create_week_record(conn, uid, start.isoformat(), current_user_hourly_rate(conn, uid))
 
-    current = None
-    past = []
-    for w in weeks:
-        try:
-            start = parse_ymd(w["start_date"])
-        except Exception:
-            continue
-        end = start + timedelta(days=6)
-        if start <= today <= end:
-            current = w
-            break
-        if start <= today:
-            past.append(w)
+def current_week_exists(conn: sqlite3.Connection, uid: int) -> bool:
+    today = local_now().date()
+    return conn.execute(
+        SQL_CURRENT_WEEK, (uid, today.isoformat(), (today - timedelta(days=6)).isoformat())
+    ).fetchone() is not None
+
+
+def ensure_current_week_for_user(conn: sqlite3.Connection, uid: int) -> Optional[sqlite3.Row]:
+    today = local_now().date()
+    today_s = today.isoformat()
 
+    current = conn.execute(SQL_CURRENT_WEEK, (uid, today_s, (today - timedelta(days=6)).isoformat())).fetchone()
     if current:
         return current
 
-    if not past:
-        return weeks[0]
+    latest = conn.execute(
+        f"SELECT {WEEK_COLS} FROM weeks WHERE user_id=? AND start_date <= ? ORDER BY start_date DESC, id DESC LIMIT 1",
+        (uid, today_s),
+    ).fetchone()
+
+    if not latest:
+        # no past week: earliest future one, or a fresh week for this Sunday
+        first = conn.execute(
+            f"SELECT {WEEK_COLS} FROM weeks WHERE user_id=? ORDER BY start_date ASC, id ASC LIMIT 1",
+            (uid,),
+        ).fetchone()
+        if first:
+            return first
+        start = sunday_start(today)
+        return create_week_record(conn, uid, start.isoformat(), current_user_hourly_rate(conn, uid))
 
-    latest = past[-1]
     hourly_rate = current_user_hourly_rate(conn, uid)
 
     while True:
@@ -1603,7 +2357,7 @@ def ensure_current_week_for_user(conn: sqlite3.Connection, uid: int) -> Optional
 
         next_start = (start + timedelta(days=7)).isoformat()
         existing = conn.execute(
-            "SELECT * FROM weeks WHERE user_id=? AND start_date=? ORDER BY id DESC LIMIT 1",
+            f"SELECT {WEEK_COLS} FROM weeks WHERE user_id=? AND start_date=? ORDER BY id DESC LIMIT 1",
             (uid, next_start),
         ).fetchone()
         if existing:
@@ -1618,14 +2372,14 @@ def ensure_current_week_for_user(conn: sqlite3.Connection, uid: int) -> Optional
         )
 
 
-def build_week_payload(
-    conn: sqlite3.Connection,
-    uid: int,
-    w: sqlite3.Row,
-    include_entries: bool = True,
-) -> tuple[dict, int, float]:
-    rate = float(w["hourly_rate"] or 0.0)
-    start_date = w["start_date"]
+def resolve_week_number(start_date: str, roster_week_number: Optional[int]) -> int:
+    # roster week number wins; otherwise derive it from the Tesco calendar
+    if roster_week_number is not None:
+        return int(roster_week_number)
+    return tesco_fiscal_week(parse_ymd(start_date))[1]
+
+
+def week_number_for_start(conn: sqlite3.Connection, uid: int, start_date: str) -> int:
     roster_week = conn.execute(
         """
         SELECT week_number
@@ -1636,65 +2390,72 @@ def build_week_payload(
         """,
         (uid, start_date),
     ).fetchone()
-    if roster_week and roster_week["week_number"] is not None:
-        week_number = int(roster_week["week_number"])
-    else:
-        _fy, week_number = tesco_fiscal_week(parse_ymd(start_date))
+    return resolve_week_number(start_date, roster_week["week_number"] if roster_week else None)
 
-    rows = conn.execute(
-        """
-        SELECT id, work_date, time_in, time_out, break_minutes, note, bh_paid, multiplier, extra_authorized
-        FROM entries
-        WHERE user_id=? AND week_id=?
-        ORDER BY work_date ASC, id ASC
-        """,
-        (uid, int(w["id"])),
-    ).fetchall()
 
-    entries = []
-    total_min = 0
-    total_pay = 0.0
+SQL_WEEK_ENTRIES = f"""
+    SELECT time_in, time_out, break_minutes, multiplier, {SQL_ENTRY_RAW_MIN} AS raw_min,
+           id, work_date, note, bh_paid, extra_authorized,
+           CASE WHEN work_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+                THEN substr('SunMonTueWedThuFriSat', 1 + 3 * CAST(strftime('%w', work_date) AS INTEGER), 3)
+           END AS weekday,
+           CASE WHEN work_date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+                THEN substr(work_date, 9, 2) || '/' || substr(work_date, 6, 2) || '/' || substr(work_date, 1, 4)
+           END AS date_ddmmyyyy
+    FROM entries e
+    WHERE user_id=? AND week_id=?
+    ORDER BY work_date ASC, id ASC
+"""
 
-    for r in rows:
-        authorized = bool(int(r["extra_authorized"] or 0) == 1)
-        mult = float(r["multiplier"] or 1.0)
-        m, pay = compute_week_entry_summary(
-            r["time_in"],
-            r["time_out"],
-            int(r["break_minutes"] or 0),
-            rate,
-            mult,
-        )
 
-        if include_entries:
-            d = parse_ymd(r["work_date"])
+def build_week_payload(
+    conn: sqlite3.Connection,
+    uid: int,
+    w: sqlite3.Row,
+    include_entries: bool = True,
+) -> tuple[dict, int, float]:
+    rate = float(w["hourly_rate"] or 0.0)
+    start_date = w["start_date"]
+    week_number = week_number_for_start(conn, uid, start_date)
+
+    # date labels come ready-made from SQL for canonical YYYY-MM-DD dates (NULL otherwise)
+    rows = fetch_tuples(conn, SQL_WEEK_ENTRIES, (uid, int(w["id"])))
+
+    mins, pays = summarize_entries(rows, rate)
+    total_min = sum(m for m in mins if m is not None)
+    total_pay = sum(pays)
+
+    entries = []
+    if include_entries:
+        for r, m, pay in zip(rows, mins, pays):
+            (time_in, time_out, break_minutes, multiplier, _raw_min,
+             entry_id, work_date, note, bh_paid, extra_authorized, weekday, date_label) = r
+            authorized = bool(int(extra_authorized or 0) == 1)
+            if weekday is None or date_label is None:
+                weekday, date_label = ymd_labels(work_date)
             entries.append(
                 {
-                    "id": int(r["id"]),
+                    "id": int(entry_id),
                     "week_id": int(w["id"]),
-                    "work_date": r["work_date"],
-                    "weekday": weekday_short_en(d),
-                    "date_ddmmyyyy": ddmmyyyy(d),
-                    "time_in": r["time_in"] or "",
-                    "time_out": r["time_out"] or "",
-                    "break_minutes": int(r["break_minutes"] or 0),
-                    "note": r["note"],
-                    "bh_paid": (None if r["bh_paid"] is None else bool(int(r["bh_paid"]))),
-                    "multiplier": float(r["multiplier"] or 1.0),
+                    "work_date": work_date,
+                    "weekday": weekday,
+                    "date_ddmmyyyy": date_label,
+                    "time_in": time_in or "",
+                    "time_out": time_out or "",
+                    "break_minutes": int(break_minutes or 0),
+                    "note": note,
+                    "bh_paid": (None if bh_paid is None else bool(int(bh_paid))),
+                    "multiplier": float(multiplier or 1.0),
                     "worked_hhmm": (min_to_hhmm(int(m)) if m is not None else ""),
                     "pay_eur": round(float(pay or 0.0), 2),
-                    "time_in_real": r["time_in"] or "",
-                    "time_out_real": r["time_out"] or "",
+                    "time_in_real": time_in or "",
+                    "time_out_real": time_out or "",
                     "time_in_paid": "",
                     "time_out_paid": "",
                     "extra_authorized": 1 if authorized else 0,
                 }
             )
 
-        if m is not None:
-            total_min += int(m)
-            total_pay += float(pay or 0.0)
-
     payload = {
         "id": int(w["id"]),
         "week_number": int(week_number),
@@ -1727,7 +2488,19 @@ def build_clock_today_payload(conn: sqlite3.Connection, uid: int) -> dict:
         }
 
     work_date = today_ymd()
-    e = get_today_entry(conn, uid, int(w["id"]), work_date)
+    # today's entry plus the stored clock state in one read
+    e = conn.execute(
+        """
+        SELECT e.time_in, e.time_out, e.break_minutes,
+               cs.week_id AS cs_week_id, cs.work_date AS cs_work_date,
+               cs.in_time AS cs_in_time, cs.out_time AS cs_out_time,
+               cs.break_minutes AS cs_break_minutes, cs.break_running AS cs_break_running
+        FROM entries e
+        LEFT JOIN clock_state cs ON cs.user_id=e.user_id
+        WHERE e.user_id=? AND e.week_id=? AND e.work_date=?
+        """,
+        (uid, int(w["id"]), work_date),
+    ).fetchone()
     if not e:
         return {
             "ok": True,
@@ -1740,52 +2513,44 @@ def build_clock_today_payload(conn: sqlite3.Connection, uid: int) -> dict:
             "break_running": False,
         }
 
-    st = conn.execute("SELECT * FROM clock_state WHERE user_id=?", (uid,)).fetchone()
+    # polling usually finds the state already in sync: answer without a write
+    if (
+        e["cs_work_date"] == work_date
+        and e["cs_week_id"] == int(w["id"])
+        and e["cs_in_time"] == e["time_in"]
+        and e["cs_out_time"] == e["time_out"]
+        and e["cs_break_minutes"] == int(e["break_minutes"] or 0)
+    ):
+        return {
+            "ok": True,
+            "has_week": True,
+            "week_id": int(w["id"]),
+            "work_date": work_date,
+            "in_time": e["cs_in_time"],
+            "out_time": e["cs_out_time"],
+            "break_minutes": int(e["cs_break_minutes"] or 0),
+            "break_running": bool(int(e["cs_break_running"] or 0)),
+        }
 
-    if not st or st["work_date"] != work_date:
-        conn.execute(
-            """
-            INSERT INTO clock_state(user_id,week_id,work_date,in_time,out_time,break_running,break_start,break_minutes,updated_at)
-            VALUES (?,?,?,?,?,?,?,?,?)
-            ON CONFLICT(user_id) DO UPDATE SET
-              week_id=excluded.week_id,
-              work_date=excluded.work_date,
-              in_time=excluded.in_time,
-              out_time=excluded.out_time,
-              break_running=0,
-              break_start=NULL,
-              break_minutes=excluded.break_minutes,
-              updated_at=excluded.updated_at
-            """,
-            (
-                uid,
-                int(w["id"]),
-                work_date,
-                e["time_in"],
-                e["time_out"],
-                0,
-                None,
-                int(e["break_minutes"] or 0),
-                now(),
-            ),
-        )
-        conn.commit()
-        st = conn.execute("SELECT * FROM clock_state WHERE user_id=?", (uid,)).fetchone()
-    else:
-        conn.execute(
-            """
-            UPDATE clock_state
-            SET week_id=?,
-                in_time=?,
-                out_time=?,
-                break_minutes=?,
-                updated_at=?
-            WHERE user_id=? AND work_date=?
-            """,
-            (int(w["id"]), e["time_in"], e["time_out"], int(e["break_minutes"] or 0), now(), uid, work_date),
-        )
-        conn.commit()
-        st = conn.execute("SELECT * FROM clock_state WHERE user_id=?", (uid,)).fetchone()
+    # one upsert covers both a new day (break reset) and a same-day sync (break kept)
+    st = conn.execute(
+        """
+        INSERT INTO clock_state(user_id,week_id,work_date,in_time,out_time,break_running,break_start,break_minutes,updated_at)
+        VALUES (?,?,?,?,?,0,NULL,?,?)
+        ON CONFLICT(user_id) DO UPDATE SET
+          week_id=excluded.week_id,
+          work_date=excluded.work_date,
+          in_time=excluded.in_time,
+          out_time=excluded.out_time,
+          break_running=CASE WHEN clock_state.work_date=excluded.work_date THEN clock_state.break_running ELSE 0 END,
+          break_start=CASE WHEN clock_state.work_date=excluded.work_date THEN clock_state.break_start ELSE NULL END,
+          break_minutes=excluded.break_minutes,
+          updated_at=excluded.updated_at
+        RETURNING in_time, out_time, break_minutes, break_running
+        """,
+        (uid, int(w["id"]), work_date, e["time_in"], e["time_out"], int(e["break_minutes"] or 0), now()),
+    ).fetchone()
+    conn.commit()
 
     return {
         "ok": True,
@@ -1800,49 +2565,41 @@ def build_clock_today_payload(conn: sqlite3.Connection, uid: int) -> dict:
 
 
 def build_dashboard_payload(conn: sqlite3.Connection, uid: int) -> dict:
-    weeks = conn.execute(
-        "SELECT * FROM weeks WHERE user_id=? ORDER BY start_date ASC",
-        (uid,),
-    ).fetchall()
-
     current_week = get_current_week(conn, uid)
 
-    total_min_all = 0
-    total_pay_all = 0.0
-    for w in weeks:
-        _payload, week_min, week_pay = build_week_payload(conn, uid, w, include_entries=False)
-        total_min_all += int(week_min)
-        total_pay_all += float(week_pay)
-
-    this_week_min = 0
-    this_week_pay = 0.0
-    this_week_payload = None
-    if current_week:
-        this_week_payload, this_week_min, this_week_pay = build_week_payload(conn, uid, current_week, include_entries=False)
+    total_min_all, total_pay_all, this_week_min, this_week_pay = entry_totals(
+        conn, uid, int(current_week["id"]) if current_week else None
+    )
 
-    supported_years = [y for y in (2025, 2026) if irish_bank_holidays(y)]
+    supported_years = list(BH_SUPPORTED_YEARS)
     bh_years_out = []
     total_allowance = 0
     total_paid = 0
 
     for y in supported_years:
         ensure_bh_for_year(conn, uid, y)
-        rows = conn.execute(
-            """
-            SELECT paid
+
+    counts: Dict[int, tuple] = {}
+    if supported_years:
+        placeholders = ",".join("?" * len(supported_years))
+        for r in conn.execute(
+            f"""
+            SELECT year,
+                   COUNT(*) AS allowance,
+                   SUM(CASE WHEN paid=1 THEN 1 ELSE 0 END) AS paid
             FROM bank_holidays
-            WHERE user_id=? AND year=?
+            WHERE user_id=? AND year IN ({placeholders})
               AND applicable=1
               AND date(bh_date) <= date('now')
+            GROUP BY year
             """,
-            (uid, y),
-        ).fetchall()
-
-        allowance = len(rows)
-        paid = sum(1 for r in rows if int(r["paid"] or 0) == 1)
-        not_paid = allowance - paid
+            (uid, *supported_years),
+        ).fetchall():
+            counts[int(r["year"])] = (int(r["allowance"]), int(r["paid"] or 0))
 
-        bh_years_out.append({"year": y, "allowance": allowance, "paid": paid, "not_paid": not_paid})
+    for y in supported_years:
+        allowance, paid = counts.get(y, (0, 0))
+        bh_years_out.append({"year": y, "allowance": allowance, "paid": paid, "not_paid": allowance - paid})
         total_allowance += allowance
         total_paid += paid
 
@@ -1850,9 +2607,9 @@ def build_dashboard_payload(conn: sqlite3.Connection, uid: int) -> dict:
 
     return {
         "this_week": {
-            "id": (int(this_week_payload["id"]) if this_week_payload else (int(current_week["id"]) if current_week else None)),
-            "week_number": (int(this_week_payload["week_number"]) if this_week_payload else (int(current_week["week_number"]) if current_week else None)),
-            "hourly_rate": (float(this_week_payload["hourly_rate"]) if this_week_payload else (float(current_week["hourly_rate"] or 0.0) if current_week else 0.0)),
+            "id": (int(current_week["id"]) if current_week else None),
+            "week_number": (week_number_for_start(conn, uid, current_week["start_date"]) if current_week else None),
+            "hourly_rate": (float(current_week["hourly_rate"] or 0.0) if current_week else 0.0),
             "hhmm": f"{this_week_min//60:02d}:{this_week_min%60:02d}",
             "pay_eur": round(this_week_pay, 2),
         },
@@ -2027,7 +2784,6 @@ def build_deliveries_stats_payload(conn: sqlite3.Connection, uid: int) -> dict:
     week_start = today - timedelta(days=today.weekday())
     week_end = week_start + timedelta(days=6)
 
-    ensure_v2_defaults(conn, uid)
     rows = conn.execute(
         """
         SELECT work_date, run_no, location, delivery_count
@@ -2147,7 +2903,28 @@ def build_home_payload(conn: sqlite3.Connection, uid: int) -> dict:
 # ======================================================
 # MULTIPLIER (Sunday / BH paid)
 # ======================================================
+# (uid, work_date) -> (multiplier, expires_at). Cleared by the BH/roster endpoints that change `paid`;
+# the TTL bounds staleness when several processes share the db.
+MULT_CACHE_TTL = 60.0
+_MULT_CACHE: Dict[tuple[int, str], tuple[float, float]] = {}
+
+
+def invalidate_multiplier_cache() -> None:
+    _MULT_CACHE.clear()
+
+
 def multiplier_for_date(conn: sqlite3.Connection, uid: int, work_date: str) -> float:
+    key = (uid, work_date)
+    hit = _MULT_CACHE.get(key)
+    t = time.monotonic()
+    if hit and hit[1] > t:
+        return hit[0]
+    mult = _multiplier_for_date_db(conn, uid, work_date)
+    _MULT_CACHE[key] = (mult, t + MULT_CACHE_TTL)
+    return mult
+
+
+def _multiplier_for_date_db(conn: sqlite3.Connection, uid: int, work_date: str) -> float:
     """
     Priority:
       1) Public Holiday paid => PUBLIC_HOLIDAY_MULT
@@ -2235,7 +3012,7 @@ def calculate_bh_pay_hours(
 @app.get("/api/bank-holidays/years")
 def bh_years(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         rows = conn.execute(
             "SELECT DISTINCT year FROM bank_holidays WHERE user_id=? ORDER BY year ASC",
             (uid,),
@@ -2243,8 +3020,8 @@ def bh_years(req: Request):
 
         years = [int(r["year"]) for r in rows if r["year"] is not None]
 
-        for y in (2025, 2026):
-            if y not in years and irish_bank_holidays(y):
+        for y in BH_SUPPORTED_YEARS:
+            if y not in years:
                 years.append(y)
 
         years = sorted(set(years))
@@ -2254,8 +3031,8 @@ def bh_years(req: Request):
 @app.get("/api/bank-holidays/year/{year}")
 def list_bh_year(year: int, req: Request):
     uid = require_user(req)
-    with db() as conn:
-        ensure_bh_for_year(conn, uid, year)
+    ensure_bh_year_seeded(uid, year)
+    with read_db() as conn:
         rows = conn.execute(
             """
             SELECT id, name, bh_date, paid, paid_date, paid_week, applicable,
@@ -2292,8 +3069,8 @@ def bh_lookup(req: Request, date_ymd: str):
     except Exception:
         raise HTTPException(400, "Invalid date")
 
-    with db() as conn:
-        ensure_bh_for_year(conn, uid, y)
+    ensure_bh_year_seeded(uid, y)
+    with read_db() as conn:
         row = conn.execute(
             """
             SELECT id, name, bh_date, paid, paid_date, paid_week
@@ -2370,6 +3147,7 @@ def patch_bh(bh_id: int, p: BhPaidPatch, req: Request):
                 )
 
         conn.commit()
+        invalidate_multiplier_cache()
 
     return {"ok": True}
 
@@ -2385,8 +3163,8 @@ def bh_available(
 ):
     """Lista BHs disponíveis até a data informada (não pagos)."""
     uid = require_user(req)
-    with db() as conn:
-        ensure_bh_for_year(conn, uid, year)
+    ensure_bh_year_seeded(uid, year)
+    with read_db() as conn:
         taking_date = taking_date.strip() if isinstance(taking_date, str) and taking_date.strip() else None
         if taking_date:
             try:
@@ -2410,8 +3188,8 @@ def bh_available(
 def bh_used(req: Request, year: int = Query(...)):
     """Lista BHs já pagos para um ano."""
     uid = require_user(req)
-    with db() as conn:
-        ensure_bh_for_year(conn, uid, year)
+    ensure_bh_year_seeded(uid, year)
+    with read_db() as conn:
         rows = conn.execute(
             """
             SELECT id, name, bh_date, paid_date, amount_paid, pay_hours, roster_day_id
@@ -2439,8 +3217,8 @@ def bh_used(req: Request, year: int = Query(...)):
 def bh_summary(req: Request, year: int = Query(...)):
     """Resumo do ano: total, pagos, disponíveis, N/A e valor total ganho."""
     uid = require_user(req)
-    with db() as conn:
-        ensure_bh_for_year(conn, uid, year)
+    ensure_bh_year_seeded(uid, year)
+    with read_db() as conn:
         rows = conn.execute(
             "SELECT paid, applicable, amount_paid FROM bank_holidays WHERE user_id=? AND year=?",
             (uid, year),
@@ -2465,7 +3243,7 @@ def bh_summary(req: Request, year: int = Query(...)):
 def bh_preview_pay(req: Request, taken_on_date: str = Query(...)):
     """Prévia do pagamento de um BH off para uma data específica."""
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         pay_hours, fallback = calculate_bh_pay_hours(conn, uid, taken_on_date)
         rate = current_user_hourly_rate(conn, uid)
         amount = round(pay_hours * rate * PUBLIC_HOLIDAY_MULT, 2)
@@ -2526,6 +3304,7 @@ def bh_consume(bh_id: int, p: BhConsumeIn, req: Request):
             (bh_id, p.roster_day_id, uid),
         )
         conn.commit()
+        invalidate_multiplier_cache()
 
         return {
             "ok": True,
@@ -2568,6 +3347,7 @@ def bh_revert(bh_id: int, req: Request):
             )
 
         conn.commit()
+        invalidate_multiplier_cache()
         return {"ok": True}
 
 
@@ -2611,6 +3391,7 @@ def bh_manual_mark_paid(bh_id: int, p: BhManualMarkPaidIn, req: Request):
             (p.taken_on_date, paid_week, pay_hours, amount_paid, bh_id, uid),
         )
         conn.commit()
+        invalidate_multiplier_cache()
         return {"ok": True, "pay_hours": pay_hours, "amount_paid": amount_paid, "fallback_used": fallback}
 
 
@@ -2636,8 +3417,7 @@ def _delivery_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
 @app.get("/api/deliveries")
 def deliveries_list(req: Request):
     uid = require_user(req)
-    with db() as conn:
-        ensure_v2_defaults(conn, uid)
+    with read_db() as conn:
         rows = conn.execute(
             """
             SELECT *
@@ -2653,8 +3433,7 @@ def deliveries_list(req: Request):
 @app.get("/api/deliveries/day")
 def deliveries_day(req: Request, date_ymd: str):
     uid = require_user(req)
-    with db() as conn:
-        ensure_v2_defaults(conn, uid)
+    with read_db() as conn:
         rows = conn.execute(
             """
             SELECT *
@@ -2667,6 +3446,24 @@ def deliveries_day(req: Request, date_ymd: str):
         return {"work_date": date_ymd, "items": [_delivery_to_dict(r) for r in rows]}
 
 
+# one statement per (user, day, run) thanks to ux_deliveries_user_day_run; created_at is kept on update
+SQL_DELIVERY_UPSERT = """
+    INSERT INTO deliveries(user_id, work_date, run_no, location, delivery_count, note, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, work_date, run_no) DO UPDATE SET
+        location=excluded.location,
+        delivery_count=excluded.delivery_count,
+        note=excluded.note,
+        updated_at=excluded.updated_at
+"""
+
+
+SQL_DELIVERY_UPSERT_RETURNING = f"""
+    {SQL_DELIVERY_UPSERT}
+    RETURNING *
+"""
+
+
 @app.post("/api/deliveries")
 def deliveries_create(p: DeliveryUpsert, req: Request):
     uid = require_user(req)
@@ -2679,34 +3476,13 @@ def deliveries_create(p: DeliveryUpsert, req: Request):
     if location not in DELIVERY_LOCATIONS:
         raise HTTPException(400, "Invalid delivery location")
 
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         ensure_v2_defaults(conn, uid)
-        existing = conn.execute(
-            "SELECT id FROM deliveries WHERE user_id=? AND work_date=? AND run_no=?",
-            (uid, work_date, int(p.run_no)),
+        ts = now()
+        row = conn.execute(
+            SQL_DELIVERY_UPSERT_RETURNING,
+            (uid, work_date, int(p.run_no), location, int(p.delivery_count), p.note, ts, ts),
         ).fetchone()
-        if existing:
-            conn.execute(
-                """
-                UPDATE deliveries
-                SET location=?, delivery_count=?, note=?, updated_at=?
-                WHERE id=? AND user_id=?
-                """,
-                (location, int(p.delivery_count), p.note, now(), int(existing["id"]), uid),
-            )
-            row_id = int(existing["id"])
-        else:
-            cur = conn.execute(
-                """
-                INSERT INTO deliveries(user_id, work_date, run_no, location, delivery_count, note, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (uid, work_date, int(p.run_no), location, int(p.delivery_count), p.note, now(), now()),
-            )
-            row_id = int(cur.lastrowid)
-
-        conn.commit()
-        row = conn.execute("SELECT * FROM deliveries WHERE id=? AND user_id=?", (row_id, uid)).fetchone()
         return {"ok": True, "item": _delivery_to_dict(row)}
 
 
@@ -2726,32 +3502,17 @@ def deliveries_day_upsert(p: DeliveriesDayUpsert, req: Request):
         if row["location"] not in DELIVERY_LOCATIONS:
             raise HTTPException(400, "Invalid delivery location")
 
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         ensure_v2_defaults(conn, uid)
-        for row in rows:
-            existing = conn.execute(
-                "SELECT id FROM deliveries WHERE user_id=? AND work_date=? AND run_no=?",
-                (uid, work_date, int(row["run_no"])),
-            ).fetchone()
-            if existing:
-                conn.execute(
-                    """
-                    UPDATE deliveries
-                    SET location=?, delivery_count=?, note=?, updated_at=?
-                    WHERE id=? AND user_id=?
-                    """,
-                    (row["location"], int(row["count"]), row["note"], now(), int(existing["id"]), uid),
-                )
-            else:
-                conn.execute(
-                    """
-                    INSERT INTO deliveries(user_id, work_date, run_no, location, delivery_count, note, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (uid, work_date, int(row["run_no"]), row["location"], int(row["count"]), row["note"], now(), now()),
-                )
+        ts = now()
+        conn.executemany(
+            SQL_DELIVERY_UPSERT,
+            [
+                (uid, work_date, int(row["run_no"]), row["location"], int(row["count"]), row["note"], ts, ts)
+                for row in rows
+            ],
+        )
 
-        conn.commit()
         items = conn.execute(
             """
             SELECT *
@@ -2812,7 +3573,7 @@ def deliveries_delete(delivery_id: int, req: Request):
 @app.get("/api/deliveries/stats")
 def deliveries_stats(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         return build_deliveries_stats_payload(conn, uid)
 
 
@@ -2822,7 +3583,7 @@ def deliveries_stats(req: Request):
 @app.get("/api/settings/reminders")
 def reminders_get(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         row = get_reminder_settings(conn, uid)
         return {
             "ok": True,
@@ -2874,7 +3635,7 @@ def reminders_put(p: ReminderSettingsUpdate, req: Request):
 @app.get("/api/settings/schedule")
 def schedule_get(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         row = get_schedule_settings(conn, uid)
         try:
             active_days = parse_days_json(row["active_days"] or "[]")
@@ -2922,7 +3683,7 @@ def schedule_put(p: ScheduleSettingsUpdate, req: Request):
 def day_details(entry_id: int, req: Request):
     uid = require_user(req)
 
-    with db() as conn:
+    with read_db() as conn:
         r = conn.execute(
             "SELECT * FROM entries WHERE id=? AND user_id=?",
             (entry_id, uid),
@@ -3071,12 +3832,12 @@ def ensure_week_from_roster(conn: sqlite3.Connection, uid: int, start_date: str)
         except Exception:
             hourly_rate = 0.0
 
-    conn.execute(
+    cur = conn.execute(
         "INSERT INTO weeks(user_id,week_number,start_date,hourly_rate,created_at) VALUES (?,?,?,?,?)",
         (uid, tesco_fiscal_week(parse_ymd(normalized_start))[1], normalized_start, float(hourly_rate), now()),
     )
     conn.commit()
-    return int(conn.execute("SELECT last_insert_rowid() id").fetchone()["id"])
+    return int(cur.lastrowid)
 
 
 # ======================================================
@@ -3085,7 +3846,7 @@ def ensure_week_from_roster(conn: sqlite3.Connection, uid: int, start_date: str)
 @app.get("/api/roster")
 def roster_list(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         rows = conn.execute(
             """
             SELECT id, week_number, start_date
@@ -3207,7 +3968,7 @@ def roster_day_lookup(req: Request, date_ymd: str = Query(..., description="YYYY
     except Exception:
         raise HTTPException(400, "Invalid date (use YYYY-MM-DD)")
 
-    with db() as conn:
+    with read_db() as conn:
         ro = roster_for_date(conn, uid, date_ymd)
 
         if not ro:
@@ -3227,14 +3988,14 @@ def roster_day_lookup(req: Request, date_ymd: str = Query(..., description="YYYY
 @app.get("/api/roster/current")
 def roster_current(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         return build_roster_current_payload(conn, uid)
 
 
 @app.get("/api/roster/{roster_id}")
 def roster_get(roster_id: int, req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
         r = conn.execute(
             "SELECT * FROM rosters WHERE id=? AND user_id=?",
             (roster_id, uid),
@@ -3304,6 +4065,7 @@ def roster_delete(roster_id: int, req: Request):
         conn.execute("DELETE FROM roster_days WHERE roster_id=? AND user_id=?", (roster_id, uid))
         conn.execute("DELETE FROM rosters WHERE id=? AND user_id=?", (roster_id, uid))
         conn.commit()
+        invalidate_multiplier_cache()
 
     return {"ok": True}
 
@@ -3338,11 +4100,11 @@ def roster_create(p: RosterCreate, req: Request):
 
         week_id = ensure_week_from_roster(conn, uid, start_date)
 
-        conn.execute(
+        cur = conn.execute(
             "INSERT INTO rosters(user_id,week_number,start_date,created_at) VALUES (?,?,?,?)",
             (uid, int(week_number), start_date, now()),
         )
-        roster_id = int(conn.execute("SELECT last_insert_rowid() id").fetchone()["id"])
+        roster_id = int(cur.lastrowid)
 
         for i, code in enumerate(p.days):
             d = start + timedelta(days=i)
@@ -3350,14 +4112,14 @@ def roster_create(p: RosterCreate, req: Request):
             shift_in, shift_out, day_off = roster_code_to_state(code)
             status = roster_code_status(code)
 
-            conn.execute(
+            cur = conn.execute(
                 """
                 INSERT INTO roster_days(user_id,roster_id,work_date,shift_in,shift_out,day_off,status,created_at)
                 VALUES (?,?,?,?,?,?,?,?)
                 """,
                 (uid, roster_id, ymd, shift_in, shift_out, day_off, status, now()),
             )
-            rd_id = int(conn.execute("SELECT last_insert_rowid() id").fetchone()["id"])
+            rd_id = int(cur.lastrowid)
 
             if status == "BANK_HOLIDAY":
                 bh_id_for_day = (p.bh_ids or {}).get(str(i))
@@ -3392,6 +4154,7 @@ def roster_create(p: RosterCreate, req: Request):
                     sync_bank_holiday_paid_for_date(conn, uid, ymd)
 
         conn.commit()
+        invalidate_multiplier_cache()
 
     return {"ok": True, "id": roster_id, "week_id": int(week_id)}
 
@@ -3483,6 +4246,7 @@ def roster_day_patch(roster_id: int, p: RosterDayPatch, req: Request):
                     sync_bank_holiday_paid_for_date(conn, uid, p.work_date)
 
         conn.commit()
+        invalidate_multiplier_cache()
 
     return {"ok": True}
 
@@ -3491,34 +4255,74 @@ def roster_day_patch(roster_id: int, p: RosterDayPatch, req: Request):
 # ======================================================
 # WEEKS / ENTRIES
 # ======================================================
+SQL_WEEKS_SUMMARY = f"""
+    SELECT t.*, printf('%02d:%02d', t.total_min / 60, t.total_min % 60) AS total_hhmm
+    FROM (
+        SELECT
+            w.id, w.start_date, w.hourly_rate,
+            (
+                SELECT r.week_number
+                FROM rosters r
+                WHERE r.user_id=w.user_id AND r.start_date=w.start_date
+                ORDER BY r.id DESC
+                LIMIT 1
+            ) AS roster_week_number,
+            COALESCE(SUM(CASE WHEN {SQL_ENTRY_HHMM_OK} THEN {SQL_ENTRY_MINUTES} END), 0) AS total_min,
+            COALESCE(SUM(CASE WHEN {SQL_ENTRY_HHMM_OK} THEN {SQL_ENTRY_PAY} END), 0.0) AS total_pay,
+            SUM(
+                CASE WHEN e.time_in IS NOT NULL AND e.time_out IS NOT NULL AND NOT ({SQL_ENTRY_HHMM_OK})
+                THEN 1 ELSE 0 END
+            ) AS odd_rows
+        FROM weeks w
+        LEFT JOIN entries e ON e.week_id=w.id AND e.user_id=w.user_id
+        WHERE w.user_id=?
+        GROUP BY w.id
+    ) t
+    ORDER BY date(t.start_date) DESC, t.id DESC
+"""
+
+SQL_WEEK_ODD_ENTRIES = f"""
+    SELECT e.time_in, e.time_out, e.break_minutes, e.multiplier, NULL AS raw_min
+    FROM entries e
+    WHERE e.user_id=? AND e.week_id=?
+      AND e.time_in IS NOT NULL AND e.time_out IS NOT NULL
+      AND NOT ({SQL_ENTRY_HHMM_OK})
+"""
+
+
 @app.get("/api/weeks")
 def list_weeks(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with read_db() as conn:
+        # per-week totals aggregated inside SQLite (same math as compute_week_entry_summary)
         rows = conn.execute(
-            """
-            SELECT * FROM weeks
-            WHERE user_id=?
-            ORDER BY date(start_date) DESC, id DESC
-            """,
+            SQL_WEEKS_SUMMARY,
             (uid,),
         ).fetchall()
 
         out = []
-        for w in rows:
-            payload, _total_min, _total_pay = build_week_payload(conn, uid, w, include_entries=False)
+        for r in rows:
+            rate = float(r["hourly_rate"] or 0.0)
+            total_hhmm, total_pay = r["total_hhmm"], float(r["total_pay"])
+            if r["odd_rows"]:
+                # non-canonical times (e.g. "9:45") keep the lenient Python parser
+                odd = fetch_tuples(conn, SQL_WEEK_ODD_ENTRIES, (uid, int(r["id"])))
+                mins, pays = summarize_entries(odd, rate)
+                total_min = int(r["total_min"]) + sum(m for m in mins if m is not None)
+                total_hhmm = f"{total_min//60:02d}:{total_min%60:02d}"
+                total_pay += sum(pays)
             out.append(
                 {
-                    "id": payload["id"],
-                    "week_number": payload["week_number"],
-                    "start_date": payload["start_date"],
-                    "hourly_rate": payload["hourly_rate"],
-                    "total_hhmm": payload["totals"]["total_hhmm"],
-                    "total_pay": payload["totals"]["total_pay"],
+                    "id": int(r["id"]),
+                    "week_number": resolve_week_number(r["start_date"], r["roster_week_number"]),
+                    "start_date": r["start_date"],
+                    "hourly_rate": rate,
+                    "total_hhmm": total_hhmm,
+                    "total_pay": round(total_pay, 2),
                 }
             )
 
-        return out
+        return FastJSONResponse(out)
 
 
 
@@ -3528,23 +4332,23 @@ def create_week(p: WeekCreate, req: Request):
     start_date = sunday_start(parse_ymd(p.start_date)).isoformat()
     _fiscal_year, week_number = tesco_fiscal_week(parse_ymd(start_date))
     with db() as conn:
-        conn.execute(
-            "INSERT INTO weeks(user_id,week_number,start_date,hourly_rate,created_at) VALUES (?,?,?,?,?)",
+        row = conn.execute(
+            "INSERT INTO weeks(user_id,week_number,start_date,hourly_rate,created_at) VALUES (?,?,?,?,?) RETURNING id",
             (uid, int(week_number), start_date, float(p.hourly_rate), now()),
-        )
+        ).fetchone()
         conn.commit()
-    return {"ok": True}
+    return {"ok": True, "id": int(row["id"])}
 
 
 @app.get("/api/weeks/{week_id}")
 def get_week(week_id: int, req: Request):
     uid = require_user(req)
-    with db() as conn:
-        w = conn.execute("SELECT * FROM weeks WHERE id=? AND user_id=?", (week_id, uid)).fetchone()
+    with read_db() as conn:
+        w = conn.execute(f"SELECT {WEEK_COLS} FROM weeks WHERE id=? AND user_id=?", (week_id, uid)).fetchone()
         if not w:
             raise HTTPException(404, "Week not found")
         payload, _total_min, _total_pay = build_week_payload(conn, uid, w, include_entries=True)
-        return payload
+        return FastJSONResponse(payload)
 
 
 
@@ -3573,28 +4377,54 @@ def delete_week(week_id: int, req: Request):
     return {"ok": True}
 
 
+SQL_ENTRY_INSERT = """
+    INSERT INTO entries(user_id,week_id,work_date,time_in,time_out,break_minutes,note,bh_paid,multiplier,created_at)
+    VALUES (?,?,?,?,?,?,?,?,?,?)
+"""
+SQL_ENTRY_UPSERT = SQL_ENTRY_INSERT + """
+    ON CONFLICT(user_id,week_id,work_date) DO UPDATE SET
+        time_in=excluded.time_in,
+        time_out=excluded.time_out,
+        break_minutes=excluded.break_minutes,
+        note=excluded.note,
+        bh_paid=excluded.bh_paid,
+        multiplier=excluded.multiplier
+"""
+
+
 @app.put("/api/weeks/{week_id}/entry")
 def upsert_entry(week_id: int, p: EntryUpsert, req: Request):
     uid = require_user(req)
 
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         w = conn.execute("SELECT id FROM weeks WHERE id=? AND user_id=?", (week_id, uid)).fetchone()
         if not w:
             raise HTTPException(404, "Week not found")
 
         mult = multiplier_for_date(conn, uid, p.work_date)
 
-        existing = conn.execute(
-            "SELECT id FROM entries WHERE user_id=? AND week_id=? AND work_date=?",
-            (uid, week_id, p.work_date),
-        ).fetchone()
-
         bh_paid_db = None
         if p.bh_paid is True:
             bh_paid_db = 1
         elif p.bh_paid is False:
             bh_paid_db = 0
 
+        fields = (
+            p.time_in,
+            p.time_out,
+            int(p.break_minutes or 0),
+            (p.note.strip() if p.note else None),
+            bh_paid_db,
+            float(mult),
+        )
+        existing = None
+        if not _ENTRIES_UNIQUE:
+            # no unique index (old DB with duplicate days): update the existing row by id
+            existing = conn.execute(
+                "SELECT id FROM entries WHERE user_id=? AND week_id=? AND work_date=?",
+                (uid, week_id, p.work_date),
+            ).fetchone()
+
         if existing:
             conn.execute(
                 """
@@ -3602,67 +4432,37 @@ def upsert_entry(week_id: int, p: EntryUpsert, req: Request):
                 SET time_in=?, time_out=?, break_minutes=?, note=?, bh_paid=?, multiplier=?
                 WHERE id=? AND user_id=?
                 """,
-                (
-                    p.time_in,
-                    p.time_out,
-                    int(p.break_minutes or 0),
-                    (p.note.strip() if p.note else None),
-                    bh_paid_db,
-                    float(mult),
-                    int(existing["id"]),
-                    uid,
-                ),
+                (*fields, int(existing["id"]), uid),
             )
         else:
+            conn.execute(
+                SQL_ENTRY_UPSERT if _ENTRIES_UNIQUE else SQL_ENTRY_INSERT,
+                (uid, week_id, p.work_date, *fields, now()),
+            )
+
+        # Sync clock_state if user edited TODAY (no-op when there is no state row)
+        if p.work_date == today_ymd():
             conn.execute(
                 """
-                INSERT INTO entries(user_id,week_id,work_date,time_in,time_out,break_minutes,note,bh_paid,multiplier,created_at)
-                VALUES (?,?,?,?,?,?,?,?,?,?)
+                UPDATE clock_state
+                SET week_id=?,
+                    in_time=?,
+                    out_time=?,
+                    break_minutes=?,
+                    updated_at=?
+                WHERE user_id=? AND work_date=?
                 """,
                 (
-                    uid,
-                    week_id,
-                    p.work_date,
+                    int(week_id),
                     p.time_in,
                     p.time_out,
                     int(p.break_minutes or 0),
-                    (p.note.strip() if p.note else None),
-                    bh_paid_db,
-                    float(mult),
                     now(),
+                    uid,
+                    p.work_date,
                 ),
             )
 
-        # Sync clock_state if user edited TODAY
-        if p.work_date == today_ymd():
-            st = conn.execute(
-                "SELECT * FROM clock_state WHERE user_id=? AND work_date=?",
-                (uid, p.work_date),
-            ).fetchone()
-            if st:
-                conn.execute(
-                    """
-                    UPDATE clock_state
-                    SET week_id=?,
-                        in_time=?,
-                        out_time=?,
-                        break_minutes=?,
-                        updated_at=?
-                    WHERE user_id=? AND work_date=?
-                    """,
-                    (
-                        int(week_id),
-                        p.time_in,
-                        p.time_out,
-                        int(p.break_minutes or 0),
-                        now(),
-                        uid,
-                        p.work_date,
-                    ),
-                )
-
-        conn.commit()
-
     return {"ok": True}
 
 
@@ -3694,13 +4494,15 @@ def delete_entry(entry_id: int, req: Request):
 def dashboard(req: Request):
     uid = require_user(req)
 
-    with db() as conn:
-        payload = build_dashboard_payload(conn, uid)
-        return {
+    # polls run on a reader; the writer is only taken when a week or BH year must be created
+    payload = read_mostly(build_dashboard_payload, uid)
+    return FastJSONResponse(
+        {
             "this_week": payload["this_week"],
             "bank_holidays_years": payload["bank_holidays_years"],
             "bank_holidays": payload["bank_holidays"],
         }
+    )
 
 
 
@@ -3713,15 +4515,13 @@ def dashboard(req: Request):
 def report_current_week(req: Request):
     uid = require_user(req)
 
-    with db() as conn:
-        return build_report_current_week_payload(conn, uid)
+    return FastJSONResponse(read_mostly(build_report_current_week_payload, uid))
 
 
 @app.get("/api/home")
 def api_home(req: Request):
     uid = require_user(req)
-    with db() as conn:
-        return build_home_payload(conn, uid)
+    return FastJSONResponse(read_mostly(build_home_payload, uid))
 
 
 # ======================================================
@@ -3774,11 +4574,30 @@ def get_week_for_today_strict(conn: sqlite3.Connection, uid: int) -> Optional[sq
 
 def get_today_entry(conn: sqlite3.Connection, uid: int, week_id: int, work_date: str) -> Optional[sqlite3.Row]:
     return conn.execute(
-        "SELECT * FROM entries WHERE user_id=? AND week_id=? AND work_date=?",
+        SQL_TODAY_ENTRY,
         (uid, week_id, work_date),
     ).fetchone()
 
 
+SQL_CREATE_TODAY_ENTRY_VALUES = """
+    INSERT INTO entries(
+        user_id,week_id,work_date,
+        time_in,time_out,break_minutes,
+        note,bh_paid,multiplier,created_at,
+        extra_authorized,extra_checked
+    )
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+SQL_CREATE_TODAY_ENTRY = f"""{SQL_CREATE_TODAY_ENTRY_VALUES}
+    ON CONFLICT(user_id,week_id,work_date) DO NOTHING
+    RETURNING {CLOCK_ENTRY_COLS}
+"""
+# without uq_entries_user_week_date there is no conflict target; the caller already checked for the row
+SQL_CREATE_TODAY_ENTRY_PLAIN = f"""{SQL_CREATE_TODAY_ENTRY_VALUES}
+    RETURNING {CLOCK_ENTRY_COLS}
+"""
+
+
 def create_today_entry(conn: sqlite3.Connection, uid: int, week_id: int, work_date: str) -> sqlite3.Row:
     row = get_today_entry(conn, uid, week_id, work_date)
     if row:
@@ -3786,21 +4605,14 @@ def create_today_entry(conn: sqlite3.Connection, uid: int, week_id: int, work_da
 
     mult = multiplier_for_date(conn, uid, work_date)
 
-    conn.execute(
-        """
-        INSERT INTO entries(
-            user_id,week_id,work_date,
-            time_in,time_out,break_minutes,
-            note,bh_paid,multiplier,created_at,
-            extra_authorized,extra_checked
-        )
-        VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-        """,
+    row = conn.execute(
+        SQL_CREATE_TODAY_ENTRY if _ENTRIES_UNIQUE else SQL_CREATE_TODAY_ENTRY_PLAIN,
         (uid, week_id, work_date, None, None, 0, None, None, float(mult), now(), 0, 0),
-    )
-    conn.commit()
+    ).fetchone()
 
-    row = get_today_entry(conn, uid, week_id, work_date)
+    if not row:
+        # lost a race with a concurrent insert: read the winner
+        row = get_today_entry(conn, uid, week_id, work_date)
     if not row:
         raise HTTPException(500, "Failed to create entry")
     return row
@@ -3809,8 +4621,8 @@ def create_today_entry(conn: sqlite3.Connection, uid: int, week_id: int, work_da
 @app.get("/api/clock/today")
 def clock_today(req: Request):
     uid = require_user(req)
-    with db() as conn:
-        return build_clock_today_payload(conn, uid)
+    # in sync (the usual poll) this never touches the writer; the sync upsert reruns on db()
+    return read_mostly(build_clock_today_payload, uid)
 
 
 @app.post("/api/clock/extra-confirm")
@@ -3837,7 +4649,7 @@ def clock_extra_confirm(p: ExtraConfirmIn, req: Request):
 @app.post("/api/clock/in")
 def clock_in(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         ensure_clock_tables(conn)
         w = get_current_week(conn, uid)
         if not w:
@@ -3899,7 +4711,6 @@ def clock_in(req: Request):
             """,
             (uid, int(w["id"]), work_date, store_in, None, 0, None, int(e["break_minutes"] or 0), now()),
         )
-        conn.commit()
 
         return {"ok": True, "work_date": work_date}
 
@@ -3907,7 +4718,7 @@ def clock_in(req: Request):
 @app.post("/api/clock/out")
 def clock_out(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         ensure_clock_tables(conn)
         w = get_current_week(conn, uid)
         if not w:
@@ -3950,21 +4761,19 @@ def clock_out(req: Request):
                 "real": real_now,
             }
 
-        st = conn.execute("SELECT * FROM clock_state WHERE user_id=?", (uid,)).fetchone()
+        st = conn.execute(SQL_CLOCK_STATE, (uid,)).fetchone()
         if st and int(st["break_running"] or 0) == 1 and st["break_start"]:
-            bs = utc_from_iso(st["break_start"])
-            add = int((datetime.now(timezone.utc) - bs).total_seconds() // 60)
-            new_break = int(st["break_minutes"] or 0) + max(0, add)
+            new_break = int(st["break_minutes"] or 0) + break_elapsed_min(st["break_start"])
 
             conn.execute(
-                "UPDATE clock_state SET break_running=0, break_start=NULL, break_minutes=?, updated_at=? WHERE user_id=?",
+                SQL_CLOCK_STOP_BREAK,
                 (new_break, now(), uid),
             )
             conn.execute(
-                "UPDATE entries SET break_minutes=? WHERE id=? AND user_id=?",
+                SQL_ENTRY_SET_BREAK,
                 (new_break, int(e["id"]), uid),
             )
-            e = conn.execute("SELECT * FROM entries WHERE id=? AND user_id=?", (int(e["id"]), uid)).fetchone()
+            e = conn.execute(SQL_ENTRY_BY_ID, (int(e["id"]), uid)).fetchone()
 
         mult = multiplier_for_date(conn, uid, work_date)
         conn.execute(
@@ -3988,15 +4797,13 @@ def clock_out(req: Request):
             (uid, int(w["id"]), work_date, None, store_out, 0, None, int(e["break_minutes"] or 0), now()),
         )
 
-        conn.commit()
-
     return {"ok": True, "work_date": work_date}
 
 
 @app.post("/api/clock/break")
 def clock_break(req: Request):
     uid = require_user(req)
-    with db() as conn:
+    with db() as conn, write_txn(conn):
         ensure_clock_tables(conn)
         w = get_current_week(conn, uid)
         if not w:
@@ -4008,7 +4815,7 @@ def clock_break(req: Request):
             raise HTTPException(400, "Clock in first")
 
         st = conn.execute(
-            "SELECT * FROM clock_state WHERE user_id=? AND work_date=?",
+            f"SELECT {CLOCK_STATE_COLS} FROM clock_state WHERE user_id=? AND work_date=?",
             (uid, work_date),
         ).fetchone()
 
@@ -4025,12 +4832,11 @@ def clock_break(req: Request):
                     e["time_in"],
                     e["time_out"],
                     1,
-                    now(),
+                    int(time.time()),
                     int(e["break_minutes"] or 0),
                     now(),
                 ),
             )
-            conn.commit()
             return {"ok": True, "break_running": True}
 
         running = int(st["break_running"] or 0) == 1
@@ -4038,9 +4844,8 @@ def clock_break(req: Request):
         if not running:
             conn.execute(
                 "UPDATE clock_state SET break_running=1, break_start=?, updated_at=? WHERE user_id=?",
-                (now(), now(), uid),
+                (int(time.time()), now(), uid),
             )
-            conn.commit()
             return {"ok": True, "break_running": True}
 
         # running == True
@@ -4049,21 +4854,17 @@ def clock_break(req: Request):
                 "UPDATE clock_state SET break_running=0, break_start=NULL, updated_at=? WHERE user_id=?",
                 (now(), uid),
             )
-            conn.commit()
             return {"ok": True, "break_running": False}
 
-        bs = utc_from_iso(st["break_start"])
-        add = int((datetime.now(timezone.utc) - bs).total_seconds() // 60)
-        new_break = int(st["break_minutes"] or 0) + max(0, add)
+        new_break = int(st["break_minutes"] or 0) + break_elapsed_min(st["break_start"])
 
         conn.execute(
-            "UPDATE clock_state SET break_running=0, break_start=NULL, break_minutes=?, updated_at=? WHERE user_id=?",
+            SQL_CLOCK_STOP_BREAK,
             (new_break, now(), uid),
         )
         conn.execute(
-            "UPDATE entries SET break_minutes=? WHERE id=? AND user_id=?",
+            SQL_ENTRY_SET_BREAK,
             (new_break, int(e["id"]), uid),
         )
-        conn.commit()
 
     return {"ok": True, "break_running": False, "break_minutes": new_break}